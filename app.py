@@ -8,6 +8,7 @@ This module provides the flaskApp object for running the Flask application
 # Use 12factor inspired environment variables or from a file
 import argparse
 import os
+from datetime import timedelta
 from pathlib import Path
 
 from flasgger import Swagger
@@ -18,14 +19,17 @@ from werkzeug.wrappers import BaseResponse
 
 import environ
 # Import my Restful api resources
-from models.user import UserModel
-from resources.item import ItemResource, ItemListResource
+from resources.item import ItemResource, ItemListResource, ItemBulkResource
 from resources.store import StoreResource, StoreListResource
 from resources.todo import TodoList, Todo
 from resources.token import TokenRefresh, TokenList
 from resources.user import UserRegister, AllUsers, UserLogin, UserLogoutAccess, UserLogoutRefresh, \
-    UserResource
+    UserLogoutAll, UserResource
+from resources.stats import CacheStats, PoolStats
+from resources.export import CatalogExport
+from utils import hashing, jwt_cache, query_stats, replicas
 from utils.blacklist_helpers import (is_token_revoked)
+from utils.user_loader import load_user
 
 # Build paths inside the project like this: BASE_DIR / "directory"
 BASE_DIR = Path(__file__).resolve().parent
@@ -131,6 +135,53 @@ flaskApp.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 flaskApp.config['PROPAGATE_EXCEPTIONS'] = True
 flaskApp.config['SQLALCHEMY_ECHO'] = True if bool(
     env('FLASK_DEBUG', default=True)) is True else False
+# Read replicas (comma separated urls): the GET requests of the catalog, users
+# and tokens read from one of them, or from the primary when all of them lag
+# more than N seconds. Every worker measures the lag every M seconds in the
+# background, with SQLALCHEMY_REPLICA_LAG_QUERY (built in for PostgreSQL
+# standbys)
+flaskApp.config['SQLALCHEMY_BINDS'] = {
+    'replica_{}'.format(number): url
+    for number, url in enumerate(
+        env('DATABASE_REPLICA_URLS', cast=list, default=[]))
+}
+flaskApp.config['SQLALCHEMY_REPLICA_BINDS'] = sorted(
+    flaskApp.config['SQLALCHEMY_BINDS'])
+flaskApp.config['SQLALCHEMY_REPLICA_MAX_LAG'] = env(
+    'SQLALCHEMY_REPLICA_MAX_LAG', cast=float, default=10.0)
+flaskApp.config['SQLALCHEMY_REPLICA_CHECK_INTERVAL'] = env(
+    'SQLALCHEMY_REPLICA_CHECK_INTERVAL', cast=float, default=5.0)
+flaskApp.config['SQLALCHEMY_REPLICA_LAG_QUERY'] = env(
+    'SQLALCHEMY_REPLICA_LAG_QUERY', default=None)
+replicas.init_app(flaskApp)
+# Connections kept by the pool of every worker (and engine), for databases
+# other than SQLite. Every worker and engine has its own pool: keep workers x
+# engines x (size + overflow) below the max_connections of the server. The
+# greenlets of a gevent worker wait for a free connection beyond that
+flaskApp.config['DATABASE_POOL_SIZE'] = env(
+    'DATABASE_POOL_SIZE', cast=int, default=10)
+# Connections opened beyond the pool size when it is exhausted (closed when
+# returned), seconds a request waits for one before failing, age in seconds
+# after which a connection is replaced (-1: never) and whether connections
+# are tested before use. `GET /api/stats/pool` shows the pools of a worker
+flaskApp.config['DATABASE_MAX_OVERFLOW'] = env(
+    'DATABASE_MAX_OVERFLOW', cast=int, default=5)
+flaskApp.config['DATABASE_POOL_TIMEOUT'] = env(
+    'DATABASE_POOL_TIMEOUT', cast=float, default=30.0)
+flaskApp.config['DATABASE_POOL_RECYCLE'] = env(
+    'DATABASE_POOL_RECYCLE', cast=int, default=-1)
+flaskApp.config['DATABASE_POOL_PRE_PING'] = env(
+    'DATABASE_POOL_PRE_PING', cast=bool, default=False)
+# Requests running more than N SQL statements are logged as warnings, e.g. a
+# query per row of a list (0: never). Outside production the statements of
+# every request are counted in the X-DB-Queries and Server-Timing headers
+flaskApp.config['DB_QUERY_WARN_COUNT'] = env(
+    'DB_QUERY_WARN_COUNT', cast=int, default=20)
+flaskApp.config['DB_QUERY_HEADERS'] = env(
+    'DB_QUERY_HEADERS',
+    cast=bool,
+    default=flaskApp.config['ENV'] != 'production')
+query_stats.init_app(flaskApp)
 
 # SECURITY WARNING: keep the secret key used in production secret!
 # Raises ImproperlyConfigured exception if SECRET_KEY not in os.environ
@@ -175,6 +226,90 @@ flaskApp.config['JWT_REFRESH_CSRF_COOKIE_PATH'] = flaskApp.config[
 # Add support of token blacklisting
 flaskApp.config['JWT_BLACKLIST_ENABLED'] = True
 flaskApp.config['JWT_BLACKLIST_TOKEN_CHECKS'] = ['access', 'refresh']
+# Max number of jti -> revoked entries kept in memory per process, 0 disables it
+flaskApp.config['JWT_REVOCATION_CACHE_SIZE'] = env(
+    'JWT_REVOCATION_CACHE_SIZE', cast=int, default=10000)
+# Every worker polls the token_events table at most every N seconds to learn
+# about tokens revoked by other workers; it bounds how stale its cache can be
+flaskApp.config['JWT_REVOCATION_POLL_INTERVAL'] = env(
+    'JWT_REVOCATION_POLL_INTERVAL', cast=float, default=1.0)
+flaskApp.config['JWT_REVOCATION_POLL_GRACE'] = env(
+    'JWT_REVOCATION_POLL_GRACE', cast=float, default=5.0)
+# Which tokens are stored: 'all' (every issued token, unknown tokens are
+# rejected) or 'revoked' (only revoked ones, checked through a Bloom filter)
+flaskApp.config['JWT_TOKEN_STORAGE'] = env('JWT_TOKEN_STORAGE', default='all')
+flaskApp.config['JWT_BLOOM_CAPACITY'] = env(
+    'JWT_BLOOM_CAPACITY', cast=int, default=100000)
+flaskApp.config['JWT_BLOOM_ERROR_RATE'] = env(
+    'JWT_BLOOM_ERROR_RATE', cast=float, default=0.001)
+flaskApp.config['JWT_BLOOM_REBUILD_INTERVAL'] = env(
+    'JWT_BLOOM_REBUILD_INTERVAL', cast=float, default=3600)
+# Write-behind of the tokens issued at login: they are queued and written in
+# multi-row INSERTs every N ms or M rows by a background writer per worker
+flaskApp.config['JWT_TOKEN_WRITE_BEHIND'] = env(
+    'JWT_TOKEN_WRITE_BEHIND', cast=bool, default=False)
+flaskApp.config['JWT_TOKEN_WRITE_BATCH_SIZE'] = env(
+    'JWT_TOKEN_WRITE_BATCH_SIZE', cast=int, default=500)
+flaskApp.config['JWT_TOKEN_WRITE_INTERVAL_MS'] = env(
+    'JWT_TOKEN_WRITE_INTERVAL_MS', cast=int, default=50)
+flaskApp.config['JWT_TOKEN_WRITE_QUEUE_SIZE'] = env(
+    'JWT_TOKEN_WRITE_QUEUE_SIZE', cast=int, default=10000)
+# Seconds a login waits for room in a full queue before writing by itself
+flaskApp.config['JWT_TOKEN_WRITE_TIMEOUT'] = env(
+    'JWT_TOKEN_WRITE_TIMEOUT', cast=float, default=1.0)
+# Tokens missing from the table are still accepted (and can be revoked) for N
+# seconds after they are issued, as they may be queued by another worker.
+# Keep it above the write interval, with room for the retries of a batch
+flaskApp.config['JWT_TOKEN_WRITE_GRACE'] = env(
+    'JWT_TOKEN_WRITE_GRACE', cast=float, default=5.0)
+# Live tokens kept per user, issuing more evicts the oldest ones. 0: unlimited
+flaskApp.config['JWT_MAX_TOKENS_PER_USER'] = env(
+    'JWT_MAX_TOKENS_PER_USER', cast=int, default=0)
+# Expired tokens are deleted N rows per transaction, sleeping between batches.
+# TOKEN_PRUNE_INTERVAL > 0 runs the pruner every N seconds in the background
+# of every worker (batches are idempotent), otherwise use `flask prune-tokens`
+flaskApp.config['TOKEN_PRUNE_BATCH_SIZE'] = env(
+    'TOKEN_PRUNE_BATCH_SIZE', cast=int, default=1000)
+flaskApp.config['TOKEN_PRUNE_PAUSE'] = env(
+    'TOKEN_PRUNE_PAUSE', cast=float, default=0.1)
+flaskApp.config['TOKEN_PRUNE_INTERVAL'] = env(
+    'TOKEN_PRUNE_INTERVAL', cast=int, default=0)
+# Once `flask partition-tokens` has been run (PostgreSQL only), the pruner
+# drops the partitions of past days and creates the ones of the next N days,
+# which must cover the lifetime of refresh tokens
+flaskApp.config['TOKEN_PARTITION_DAYS_AHEAD'] = env(
+    'TOKEN_PARTITION_DAYS_AHEAD', cast=int, default=32)
+# Default and maximum number of rows of a page of the list endpoints
+flaskApp.config['API_PAGE_SIZE'] = env('API_PAGE_SIZE', cast=int, default=100)
+flaskApp.config['API_MAX_PAGE_SIZE'] = env(
+    'API_MAX_PAGE_SIZE', cast=int, default=1000)
+# Items of a bulk import inserted per statement and commit, and errors reported
+flaskApp.config['ITEM_IMPORT_BATCH_SIZE'] = env(
+    'ITEM_IMPORT_BATCH_SIZE', cast=int, default=500)
+flaskApp.config['ITEM_IMPORT_MAX_ERRORS'] = env(
+    'ITEM_IMPORT_MAX_ERRORS', cast=int, default=100)
+# Users loaded for JWT protected requests are cached per process for N seconds
+flaskApp.config['USER_CACHE_SIZE'] = env(
+    'USER_CACHE_SIZE', cast=int, default=1000)
+flaskApp.config['USER_CACHE_TTL'] = env('USER_CACHE_TTL', cast=int, default=60)
+# Threads hashing passwords off the event loop of gevent workers, 0 disables
+flaskApp.config['PASSWORD_HASH_POOL_SIZE'] = env(
+    'PASSWORD_HASH_POOL_SIZE', cast=int, default=2)
+# PBKDF2 rounds of password hashes (0: passlib default), pick them with
+# `flask calibrate-hash`. Users logging in with other rounds are rehashed
+flaskApp.config['PASSWORD_HASH_ROUNDS'] = env(
+    'PASSWORD_HASH_ROUNDS', cast=int, default=0)
+hashing.configure(flaskApp.config['PASSWORD_HASH_POOL_SIZE'],
+                  flaskApp.config['PASSWORD_HASH_ROUNDS'])
+# Build the current user of access tokens from their claims, never from the
+# users table. Access tokens are then short lived, to bound staleness
+flaskApp.config['JWT_CLAIMS_ONLY_PRINCIPAL'] = env(
+    'JWT_CLAIMS_ONLY_PRINCIPAL', cast=bool, default=False)
+flaskApp.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(
+    seconds=env(
+        'JWT_ACCESS_TOKEN_EXPIRES',
+        cast=int,
+        default=300 if flaskApp.config['JWT_CLAIMS_ONLY_PRINCIPAL'] else 900))
 
 # -----------
 # Middlewares
@@ -269,7 +404,7 @@ def user_loader_callback(identity):
     # if identity not in users_to_roles:
     #     return None
 
-    return UserModel.find_by_username(identity)
+    return load_user(identity)
 
 
 # You can override the error returned to the user if the
@@ -283,6 +418,17 @@ def custom_user_loader_error(identity):
     return jsonify(ret), 404
 
 
+# Verify every token once per process and serve its decoded claims from
+# memory until it expires. Revoked tokens are still rejected by the
+# token_in_blacklist_loader below, on every request
+flaskApp.config['JWT_DECODE_CACHE'] = env(
+    'JWT_DECODE_CACHE', cast=bool, default=False)
+flaskApp.config['JWT_DECODE_CACHE_SIZE'] = env(
+    'JWT_DECODE_CACHE_SIZE', cast=int, default=10000)
+if flaskApp.config['JWT_DECODE_CACHE']:
+    jwt_cache.install()
+
+
 # Define our callback function to check if a token has been revoked or not
 @jwt.token_in_blacklist_loader
 def check_if_token_in_blacklist(decrypted_token):
@@ -427,6 +573,14 @@ swagger_template = {
             'name': 'Auth',
             'description': 'Auth methods'
         },
+        {
+            'name': 'Export',
+            'description': 'Full dumps of the catalog, streamed'
+        },
+        {
+            'name': 'Stats',
+            'description': 'Runtime statistics of the worker: ADMIN ONLY'
+        },
         {
             'name': 'Status codes',
             'description': 'Generates responses with given status code'
@@ -483,6 +637,10 @@ api.add_resource(ItemResource,
 api.add_resource(StoreResource,
                  flaskApp.config['BASE_API_URL'] + '/store/<string:name>')
 api.add_resource(ItemListResource, flaskApp.config['BASE_API_URL'] + '/items')
+api.add_resource(ItemBulkResource,
+                 flaskApp.config['BASE_API_URL'] + '/items/bulk')
+api.add_resource(CatalogExport,
+                 flaskApp.config['BASE_API_URL'] + '/export/<string:kind>')
 api.add_resource(StoreListResource,
                  flaskApp.config['BASE_API_URL'] + '/stores')
 
@@ -496,9 +654,12 @@ api.add_resource(UserLogoutAccess,
                  flaskApp.config['BASE_API_URL'] + '/logout/access')
 api.add_resource(UserLogoutRefresh,
                  flaskApp.config['BASE_API_URL'] + '/logout/refresh')
+api.add_resource(UserLogoutAll, flaskApp.config['BASE_API_URL'] + '/logout/all')
 
 api.add_resource(TokenRefresh, '/token/refresh')
 api.add_resource(TokenList, flaskApp.config['BASE_API_URL'] + '/token')
+api.add_resource(CacheStats, flaskApp.config['BASE_API_URL'] + '/stats/cache')
+api.add_resource(PoolStats, flaskApp.config['BASE_API_URL'] + '/stats/pool')
 # To-Do api restful resources
 api.add_resource(TodoList, '/todos')
 api.add_resource(Todo, '/todos/<todo_id>')
@@ -516,6 +677,7 @@ api.add_resource(Todo, '/todos/<todo_id>')
 #     return jsonify({"message": "We could not authorize. Did you include the valid authorization header?"}), 401
 
 from views import *
+from commands import *
 
 if __name__ == "__main__":
     from db import db
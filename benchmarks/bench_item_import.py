@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_item_import.py
+
+Imports N items through POST /api/items/bulk, as NDJSON and as CSV, and
+reports the rate. The notification sent after every import is disabled.
+
+Usage: SECRET_KEY=... python benchmarks/bench_item_import.py [--items 100000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('FLASK_DEBUG', '0')
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_FILE
+
+from app import flaskApp
+from db import db
+from models.item import ItemModel
+from models.store import StoreModel
+from models.user import UserModel
+
+
+def ndjson_body(prefix, count):
+    return '\n'.join(
+        json.dumps({'name': '{}{}'.format(prefix, n), 'price': 9.99,
+                    'store_id': 1}) for n in range(count))
+
+
+def csv_body(prefix, count):
+    return 'name,price,store_id\n' + '\n'.join(
+        '{}{},9.99,1'.format(prefix, n) for n in range(count))
+
+
+def bench(client, headers, name, body, content_type):
+    start = time.perf_counter()
+    resp = client.post(
+        '/api/items/bulk',
+        data=body,
+        headers=dict(headers, **{'Content-Type': content_type}))
+    elapsed = time.perf_counter() - start
+    stats = json.loads(resp.data.decode('utf-8'))
+    assert resp.status_code == 200 and not stats['failed'], stats
+    print('{:<8} {:>7} items in {:6.2f} s  {:>9.0f} items/s  ({} batches)'.format(
+        name, stats['inserted'], elapsed, stats['inserted'] / elapsed,
+        stats['batches']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=100000)
+    args = parser.parse_args()
+
+    flaskApp.config['SQLALCHEMY_ECHO'] = False
+    db.init_app(flaskApp)
+    with flaskApp.app_context():
+        db.create_all()
+        UserModel('bench', 'bench', 'bench', is_admin=False).save_to_db()
+        StoreModel('bench').save_to_db()
+
+    with flaskApp.test_client() as client, mock.patch(
+            'utils.notifications.NotificationDispatcher.send_sms'):
+        resp = client.post(
+            '/api/auth',
+            data=json.dumps({'username': 'bench', 'password': 'bench'}),
+            headers={'Content-Type': 'application/json'})
+        token = json.loads(resp.data.decode('utf-8'))['access_token']
+        headers = {'Authorization': 'Bearer ' + token}
+
+        bench(client, headers, 'NDJSON', ndjson_body('n', args.items),
+              'application/x-ndjson')
+        bench(client, headers, 'CSV', csv_body('c', args.items), 'text/csv')
+
+    with flaskApp.app_context():
+        print('items table: {} rows'.format(ItemModel.query.count()))
+    os.remove(DB_FILE)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_jwt_decode.py
+
+Measures the throughput of an authenticated GET (the same bearer token on
+every request) with the decoded-JWT cache (JWT_DECODE_CACHE) off and on,
+and the cost of decoding the token alone.
+
+Usage: SECRET_KEY=... python benchmarks/bench_jwt_decode.py [--rounds 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('FLASK_DEBUG', '0')
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_FILE
+
+from app import flaskApp
+from db import db
+from models.user import UserModel
+from utils import jwt_cache
+
+
+def bench_decode(token, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        jwt_cache.decode_token(token)
+    return (time.perf_counter() - start) / rounds
+
+
+def bench_get(client, headers, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        resp = client.get('/api/protected', headers=headers)
+        assert resp.status_code == 200, resp.data
+    return rounds / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    flaskApp.config['SQLALCHEMY_ECHO'] = False
+    db.init_app(flaskApp)
+    with flaskApp.app_context():
+        db.create_all()
+        UserModel('bench', 'bench', 'bench', is_admin=False).save_to_db()
+
+    with flaskApp.test_client() as client:
+        resp = client.post(
+            '/api/auth',
+            data=json.dumps({'username': 'bench', 'password': 'bench'}),
+            headers={'Content-Type': 'application/json'})
+        token = json.loads(resp.data.decode('utf-8'))['access_token']
+        headers = {'Authorization': 'Bearer ' + token}
+
+        for enabled in (False, True):
+            flaskApp.config['JWT_DECODE_CACHE'] = enabled
+            if enabled:
+                jwt_cache.install()
+            with flaskApp.app_context():
+                decode = bench_decode(token, args.rounds)
+            bench_get(client, headers, args.rounds // 10 or 1)  # warm up
+            throughput = bench_get(client, headers, args.rounds)
+            print('JWT_DECODE_CACHE={!s:<5}  decode {:7.1f} us   '
+                  'GET /api/protected {:7.1f} req/s'.format(
+                      enabled, 1e6 * decode, throughput))
+    os.remove(DB_FILE)
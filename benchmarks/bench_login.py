@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_login.py
+
+Measures the cost of persisting the tokens issued at login: the former
+decode_token + save_to_db per token, against add_tokens_to_database, and
+the end to end latency of POST /api/auth.
+
+Usage: SECRET_KEY=... python benchmarks/bench_login.py [--rounds 200]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('FLASK_DEBUG', '0')
+DB_FILE = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + DB_FILE
+
+from flask_jwt_extended import (create_access_token, create_refresh_token,
+                                decode_token)
+
+from app import flaskApp
+from db import db
+from models.token import TokenModel
+from models.user import UserModel
+from utils.blacklist_helpers import (_epoch_utc_to_datetime,
+                                     add_tokens_to_database)
+
+
+def legacy_add_token_to_database(encoded_token, identity_claim):
+    # What every login did twice before: verify the token again, then commit
+    decoded_token = decode_token(encoded_token)
+    TokenModel(
+        jti=decoded_token['jti'],
+        token_type=decoded_token['type'],
+        user_identity=decoded_token[identity_claim],
+        expires=_epoch_utc_to_datetime(decoded_token['exp']),
+        revoked=False).save_to_db()
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100.0))]
+
+
+def report(name, samples):
+    print('{:<28} mean {:7.3f} ms   p50 {:7.3f} ms   p99 {:7.3f} ms'.format(
+        name, 1000 * sum(samples) / len(samples), 1000 * percentile(samples, 50),
+        1000 * percentile(samples, 99)))
+
+
+def bench_persistence(user, rounds):
+    claim = flaskApp.config['JWT_IDENTITY_CLAIM']
+    legacy, batched = [], []
+    for _ in range(rounds):
+        tokens = [create_access_token(identity=user, fresh=True),
+                  create_refresh_token(identity=user)]
+        start = time.perf_counter()
+        for token in tokens:
+            legacy_add_token_to_database(token, claim)
+        legacy.append(time.perf_counter() - start)
+
+        tokens = [create_access_token(identity=user, fresh=True),
+                  create_refresh_token(identity=user)]
+        start = time.perf_counter()
+        add_tokens_to_database(tokens, claim)
+        batched.append(time.perf_counter() - start)
+    report('persist: decode + 2 commits', legacy)
+    report('persist: batch, 1 commit', batched)
+
+
+def bench_login(rounds):
+    samples = []
+    with flaskApp.test_client() as client:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            resp = client.post(
+                '/api/auth',
+                data=json.dumps({'username': 'bench', 'password': 'bench'}),
+                headers={'Content-Type': 'application/json'})
+            samples.append(time.perf_counter() - start)
+            assert resp.status_code == 200, resp.data
+    report('POST /api/auth', samples)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    flaskApp.config['SQLALCHEMY_ECHO'] = False
+    db.init_app(flaskApp)
+    with flaskApp.app_context():
+        db.create_all()
+        user = UserModel('bench', 'bench', 'bench', is_admin=False)
+        user.save_to_db()
+        bench_persistence(user, args.rounds)
+        bench_login(args.rounds // 4 or 1)
+    os.remove(DB_FILE)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+benchmarks/bench_login_storm.py
+
+Serves the app with a gevent WSGI server in a subprocess, like a gevent
+gunicorn worker, while several clients log in non stop and another one
+probes GET /home. It runs once hashing passwords inline and once on the
+hashing pool, and reports the latency of the probe, an endpoint unrelated
+to logins.
+
+Usage: SECRET_KEY=... python benchmarks/bench_login_storm.py [--logins 8]
+       [--seconds 10] [--pool 4]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def serve(port, pool_size, db_file):
+    from utils import gevent_support
+    gevent_support.patch_all()
+
+    os.environ['FLASK_DEBUG'] = '0'
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+    os.environ['PASSWORD_HASH_POOL_SIZE'] = str(pool_size)
+    from gevent.pywsgi import WSGIServer
+
+    from app import flaskApp
+    from db import db
+    from models.user import UserModel
+
+    flaskApp.config['SQLALCHEMY_ECHO'] = False
+    db.init_app(flaskApp)
+    with flaskApp.app_context():
+        db.create_all()
+        UserModel('bench', 'bench', 'bench', is_admin=False).save_to_db()
+    WSGIServer(('127.0.0.1', port), flaskApp, log=None).serve_forever()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen('http://127.0.0.1:{}/home'.format(port))
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('The server did not start')
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100.0))]
+
+
+def storm(port, logins, seconds):
+    stop = threading.Event()
+    probe_latencies = []
+    login_count = [0]
+    base_url = 'http://127.0.0.1:{}'.format(port)
+
+    def login():
+        body = json.dumps({'username': 'bench', 'password': 'bench'}).encode()
+        while not stop.is_set():
+            request = urllib.request.Request(
+                base_url + '/api/auth',
+                data=body,
+                headers={'Content-Type': 'application/json'})
+            urllib.request.urlopen(request).read()
+            login_count[0] += 1
+
+    def probe():
+        while not stop.is_set():
+            start = time.perf_counter()
+            urllib.request.urlopen(base_url + '/home').read()
+            probe_latencies.append(time.perf_counter() - start)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=login) for _ in range(logins)]
+    threads.append(threading.Thread(target=probe))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return probe_latencies, login_count[0]
+
+
+def run(pool_size, args):
+    port = free_port()
+    db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    server = subprocess.Popen([
+        sys.executable, __file__, '--serve',
+        str(port), '--pool',
+        str(pool_size), '--db', db_file
+    ])
+    try:
+        wait_for(port)
+        # Unloaded baseline, then the storm
+        idle, _ = storm(port, 0, 2)
+        loaded, logins = storm(port, args.logins, args.seconds)
+    finally:
+        server.terminate()
+        server.wait()
+        os.remove(db_file)
+
+    print('hash pool {:>2}: {:5.1f} logins/s | GET /home idle p99 {:7.2f} ms'
+          ' | under storm p50 {:7.2f} ms p99 {:7.2f} ms'.format(
+              pool_size, logins / float(args.seconds),
+              1000 * percentile(idle, 99), 1000 * percentile(loaded, 50),
+              1000 * percentile(loaded, 99)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=8)
+    parser.add_argument('--seconds', type=int, default=10)
+    parser.add_argument('--pool', type=int, default=4)
+    parser.add_argument('--serve', type=int)
+    parser.add_argument('--db')
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.pool, args.db)
+    else:
+        run(0, args)
+        run(args.pool, args)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Module commands.py
+
+Flask CLI commands of the application, run them with:
+    FLASK_APP=run.py flask <command>
+"""
+import sys
+
+import click
+
+from app import flaskApp
+from exception import PartitioningNotSupported
+from utils import hashing, token_partitions
+from utils.blacklist_helpers import prune_database
+from utils.catalog_export import EXPORTS, FORMATS, iter_export
+
+
+@flaskApp.cli.command('prune-tokens')
+@click.option(
+    '--batch-size',
+    type=int,
+    default=lambda: flaskApp.config['TOKEN_PRUNE_BATCH_SIZE'],
+    help='Rows deleted per statement and transaction.')
+@click.option(
+    '--pause',
+    type=float,
+    default=lambda: flaskApp.config['TOKEN_PRUNE_PAUSE'],
+    help='Seconds to sleep between batches.')
+def prune_tokens(batch_size, pause):
+    """Deletes the expired tokens from the database."""
+    stats = prune_database(batch_size, pause)
+    click.echo('Pruned {deleted} expired tokens in {seconds}s '
+               '({rows_per_second} rows/s)'.format(**stats))
+
+
+@flaskApp.cli.command('partition-tokens')
+@click.option(
+    '--days-ahead',
+    type=int,
+    default=lambda: flaskApp.config['TOKEN_PARTITION_DAYS_AHEAD'],
+    help='Days of partitions created ahead of today.')
+def partition_tokens(days_ahead):
+    """Partitions the tokens table by day of expiry (PostgreSQL only)."""
+    try:
+        token_partitions.partition_table(days_ahead)
+    except PartitioningNotSupported as ex:
+        raise click.ClickException(str(ex))
+    click.echo('{} is partitioned in {} daily partitions'.format(
+        token_partitions.TABLE, len(token_partitions.list_partitions())))
+
+
+@flaskApp.cli.command('calibrate-hash')
+@click.option(
+    '--target-ms',
+    type=float,
+    default=100,
+    help='Latency budget of one password hash, in milliseconds.')
+def calibrate_hash(target_ms):
+    """Measures PBKDF2 on this host and recommends its rounds."""
+    rounds, ms_per_1000 = hashing.calibrate(target_ms)
+    click.echo('{:.3f} ms per 1000 rounds on this host'.format(ms_per_1000))
+    click.echo('Recommended: PASSWORD_HASH_ROUNDS={} (~{:.0f} ms per hash, '
+               '~{:.0f} logins/s per core)'.format(
+                   rounds, rounds * ms_per_1000 / 1000,
+                   1000000 / (rounds * ms_per_1000)))
+
+
+@flaskApp.cli.command('export-catalog')
+@click.argument('kind', type=click.Choice(sorted(EXPORTS)))
+@click.option(
+    '--format',
+    'fmt',
+    type=click.Choice(sorted(FORMATS)),
+    default='ndjson',
+    help='Format of the dump.')
+@click.option(
+    '--store-id', type=int, help='Exports only the items of this store.')
+@click.option('--gzip', is_flag=True, help='Compresses the dump.')
+@click.option(
+    '--output',
+    type=click.Path(dir_okay=False, writable=True),
+    help='File written, standard output by default.')
+def export_catalog(kind, fmt, store_id, gzip, output):
+    """Streams all the items or stores as NDJSON or CSV."""
+    out = open(output, 'wb') if output else sys.stdout.buffer
+    try:
+        for chunk in iter_export(kind, fmt, store_id, gzip):
+            out.write(chunk)
+    finally:
+        if output:
+            out.close()
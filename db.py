@@ -1,4 +1,39 @@
 # -*- coding: utf-8 -*-
-from flask_sqlalchemy import SQLAlchemy
+from flask import g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import orm
+from sqlalchemy.sql import Select
 
-db = SQLAlchemy()
+from utils.db_pool import pool_options
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session that sends the plain SELECTs of a request to the read replica
+    bind chosen for it (g.db_read_bind, see utils.replicas.read_from_replica).
+    Flushes, DML, SELECT ... FOR UPDATE, raw SQL and every statement of other
+    requests use the primary database.
+    """
+
+    def get_bind(self, mapper=None, clause=None):
+        bind = g.get('db_read_bind') if has_app_context() else None
+        if (bind is not None and not self._flushing and
+                isinstance(clause, Select) and clause._for_update_arg is None):
+            return get_state(self.app).db.get_engine(self.app, bind=bind)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        # SQLite engines do not pool connections (NullPool)
+        if not sa_url.drivername.startswith('sqlite'):
+            for option, value in pool_options(app.config).items():
+                options.setdefault(option, value)
+        return super(RoutingSQLAlchemy, self).apply_driver_hacks(
+            app, sa_url, options)
+
+
+db = RoutingSQLAlchemy()
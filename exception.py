@@ -8,6 +8,22 @@ class TokenNotFound(Exception):
     pass
 
 
+class TokenWriteError(Exception):
+    """
+    Indicates that tokens issued at login could not be written to the
+    database by the write-behind token writer
+    """
+    pass
+
+
+class PartitioningNotSupported(Exception):
+    """
+    Indicates that the database does not support the partitioning of the
+    tokens table (PostgreSQL only)
+    """
+    pass
+
+
 class ItemNotFoundError(Exception):
     """
     Indicates that an item could not be found in the database
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import os
 from multiprocessing import cpu_count
 
 
@@ -13,7 +14,13 @@ backlog = 2048
 # Worker Processes
 workers = cpu_count() * 2 + 1  # Valor recomendado por la doc oficial: http://docs.gunicorn.org/en/stable/design.html#how-many-workers
 worker_class = 'gevent'  # Le decimos que utilice gevent para un mejor rendimiento.
-worker_connections = 1000
+# Greenlets (concurrent requests) per worker. They share the database pool of
+# the worker, sized on its own (DATABASE_POOL_SIZE in app.py)
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
+# The gevent worker patches the standard library before it loads the app, and
+# run.py makes psycopg2 cooperative then. Preloading the app in the master
+# would import them unpatched, keep it disabled
+preload_app = False
 max_requests = 0  # Unlimited requests
 keepalive = 5
 timeout = 30  # Workers silent for more than this many seconds are killed and restarted.
@@ -38,4 +45,14 @@ errorlog = '/var/log/gunicorn/stores_api_webapp.error.log'
 # Process Naming
 proc_name = 'stores_api_webapp'
 
+
+# Server Hooks
+def worker_exit(server, worker):
+    # Write the tokens still queued by the write-behind token writer
+    from run import application
+    writer = application.extensions.get('token_writer')
+    if writer is not None:
+        writer.stop(timeout=graceful_timeout)
+
+
 ###### End Gunicorn settings#####
\ No newline at end of file
@@ -0,0 +1,73 @@
+"""Add the indexes of the hot lookup columns
+
+Unique indexes on stores.name, users.username and revoked_tokens.jti, and
+indexes for items by (store_id, name) and by name, tokens by expires and by
+(user_identity, id), and token events by creation time.
+
+Tables that do not exist yet are skipped, db.create_all() creates them
+with their indexes, and indexes that already exist are kept, so it can run
+on databases created by any version of the app. Duplicated store names,
+usernames or jtis make the upgrade fail: remove them first.
+
+Revision ID: a1f3c2d9e4b0
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1f3c2d9e4b0'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (table, index, columns, unique)
+INDEXES = [
+    ('stores', 'ix_stores_name', ['name'], True),
+    ('users', 'ix_users_username', ['username'], True),
+    ('items', 'ix_items_name', ['name'], False),
+    ('items', 'ix_items_store_id_name', ['store_id', 'name'], False),
+    ('revoked_tokens', 'ix_revoked_tokens_jti', ['jti'], True),
+    ('revoked_tokens', 'ix_revoked_tokens_expires', ['expires'], False),
+    ('revoked_tokens', 'ix_revoked_tokens_user_identity_id',
+     ['user_identity', 'id'], False),
+    ('token_events', 'ix_token_events_created', ['created'], False),
+]
+
+
+def _is_partitioned(bind, table):
+    # See utils/token_partitions.py (PostgreSQL only)
+    if bind.dialect.name != 'postgresql':
+        return False
+    kind = bind.execute(
+        sa.text("SELECT relkind FROM pg_class WHERE relname = :table"),
+        table=table).scalar()
+    return kind == 'p'
+
+
+def _existing_indexes(inspector, table):
+    return {index['name'] for index in inspector.get_indexes(table)}
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = inspector.get_table_names()
+    for table, name, columns, unique in INDEXES:
+        if table not in tables or name in _existing_indexes(inspector, table):
+            continue
+        if unique and _is_partitioned(bind, table):
+            # Unique indexes must include the partition key
+            columns = columns + ['expires']
+        op.create_index(name, table, columns, unique=unique)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+    for table, name, _, _ in reversed(INDEXES):
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
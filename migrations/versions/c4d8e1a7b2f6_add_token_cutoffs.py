@@ -0,0 +1,40 @@
+"""Add the token_cutoffs table
+
+Logouts everywhere recorded while issued tokens are written behind, see
+TokenCutoffModel. It is skipped if db.create_all() created it already.
+
+Revision ID: c4d8e1a7b2f6
+Revises: a1f3c2d9e4b0
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d8e1a7b2f6'
+down_revision = 'a1f3c2d9e4b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'token_cutoffs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'token_cutoffs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_identity', sa.String(length=50), nullable=False),
+        sa.Column('revoked_before', sa.DateTime(), nullable=False),
+        sa.Column('expires', sa.DateTime(), nullable=False),
+        sa.Column('created', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_token_cutoffs_expires', 'token_cutoffs', ['expires'])
+    op.create_index('ix_token_cutoffs_created', 'token_cutoffs', ['created'])
+
+
+def downgrade():
+    op.drop_index('ix_token_cutoffs_created', table_name='token_cutoffs')
+    op.drop_index('ix_token_cutoffs_expires', table_name='token_cutoffs')
+    op.drop_table('token_cutoffs')
@@ -21,6 +21,52 @@ class BaseModel(object):
     def find_by(cls, **kwargs):
         return cls.query.filter_by(**kwargs)
 
+    @classmethod
+    def query_fields(cls, *fields):
+        """
+        Query of the given columns only, e.g. query_fields('name'), for the
+        responses that return a few fields: rows are plain tuples with those
+        attributes, no model is instantiated. The id is always selected, so
+        the query can be paginated with find_page.
+        """
+        if 'id' not in fields:
+            fields = ('id',) + fields
+        return db.session.query(*[getattr(cls, field) for field in fields])
+
+    @classmethod
+    def stream_all(cls, query=None, batch_size=1000):
+        """
+        Iterates over all the rows of query (all the rows by default) in
+        primary key order, fetching them batch_size at a time (a server-side
+        cursor on PostgreSQL), so they are never all in memory at once
+        """
+        if query is None:
+            query = cls.query
+        return query.order_by(cls.id).yield_per(batch_size)
+
+    @classmethod
+    def find_page(cls, limit, after=None, query=None):
+        """
+        Keyset pagination in primary key order: returns the first limit rows
+        of query (all the rows by default) with an id greater than after, and
+        the cursor of the next page, None on the last one. query may select
+        columns instead of models, the id column included.
+        With limit None every row is returned.
+        """
+        if query is None:
+            query = cls.query
+        if after is not None:
+            query = query.filter(cls.id > after)
+        query = query.order_by(cls.id)
+        if limit is None:
+            return query.all(), None
+
+        # One more row tells if there is a next page
+        rows = query.limit(limit + 1).all()
+        if len(rows) > limit:
+            return rows[:limit], rows[limit - 1].id
+        return rows, None
+
     def json(self):
         raise NotImplementedError()
 
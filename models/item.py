@@ -13,9 +13,11 @@ class ItemModel(db.Model, BaseModel):
     ItemModel class
     """
     __tablename__ = 'items'
+    # Items of a store by name, and items by name (find_by_name)
+    __table_args__ = (db.Index('ix_items_store_id_name', 'store_id', 'name'),)
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(80))
+    name = db.Column(db.String(80), index=True)
     price = db.Column(db.Float(precision=2))
 
     store_id = db.Column(db.Integer, db.ForeignKey('stores.id'))
@@ -5,6 +5,8 @@ models/store.py
 Module that contains the model definition for stores in a SQLAlchemy database.
 """
 
+from sqlalchemy.orm import selectinload
+
 from db import db
 from exception import ItemNotFoundError
 from models.base_model import BaseModel
@@ -18,9 +20,13 @@ class StoreModel(db.Model, BaseModel):
     __tablename__ = 'stores'
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(80))
+    name = db.Column(db.String(80), unique=True, index=True)
 
     items = db.relationship('ItemModel', lazy='dynamic')
+    # Loaded list of the same items, which can be eager loaded for many stores
+    # at once (see find_all_with_items). Changes go through items
+    item_list = db.relationship(
+        'ItemModel', viewonly=True, order_by='ItemModel.id')
 
     def __init__(self, name):
         self.name = name
@@ -29,9 +35,17 @@ class StoreModel(db.Model, BaseModel):
         return {
             'id': self.id,
             'name': self.name,
-            'items': [item.json() for item in self.items.all()]
+            'items': [item.json() for item in self.item_list]
         }
 
+    @classmethod
+    def query_with_items(cls):
+        """
+        Query of the stores with their items, in two queries whatever the
+        number of stores: one for the stores, one for the items of all of them
+        """
+        return cls.query.options(selectinload(cls.item_list))
+
     def create_item(self, name, price):
         ItemModel(name, price, self.id).save_to_db()
 
@@ -10,12 +10,16 @@ from .base_model import BaseModel
 
 class TokenModel(db.Model, BaseModel):
     __tablename__ = 'revoked_tokens'
+    # Keyset pagination of the tokens of a user, see get_user_tokens
+    __table_args__ = (db.Index('ix_revoked_tokens_user_identity_id',
+                               'user_identity', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
-    jti = db.Column(db.String(36), nullable=False)
+    jti = db.Column(db.String(36), nullable=False, unique=True, index=True)
     token_type = db.Column(db.String(10), nullable=False)
     user_identity = db.Column(db.String(50), nullable=False)
     revoked = db.Column(db.Boolean, nullable=False)
-    expires = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, index=True)
 
     def json(self):
         return {
@@ -41,3 +45,52 @@ class TokenModel(db.Model, BaseModel):
             return token.revoked
         except NoResultFound:
             return True
+
+
+class TokenEventModel(db.Model, BaseModel):
+    """
+    Append-only feed of revocation changes. Every worker polls it to refresh
+    its in-process cache of token states (see utils/blacklist_helpers.py).
+    """
+    __tablename__ = 'token_events'
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=False)
+    revoked = db.Column(db.Boolean, nullable=False)
+    expires = db.Column(db.DateTime, nullable=False)
+    created = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __init__(self, jti, revoked, expires):
+        self.jti = jti
+        self.revoked = revoked
+        self.expires = expires
+
+    def json(self):
+        return {
+            'event_id': self.id,
+            'jti': self.jti,
+            'revoked': self.revoked,
+            'expires': self.expires,
+            'created': self.created
+        }
+
+
+class TokenCutoffModel(db.Model, BaseModel):
+    """
+    Logout everywhere of a user while issued tokens are written behind: every
+    token of user_identity issued before revoked_before is revoked, those
+    still queued by the writer of a worker at the time included (see
+    utils/blacklist_helpers.py). Kept until the tokens it covers expire.
+    """
+    __tablename__ = 'token_cutoffs'
+    id = db.Column(db.Integer, primary_key=True)
+    user_identity = db.Column(db.String(50), nullable=False)
+    revoked_before = db.Column(db.DateTime, nullable=False)
+    expires = db.Column(db.DateTime, nullable=False, index=True)
+    created = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __init__(self, user_identity, revoked_before, expires):
+        self.user_identity = user_identity
+        self.revoked_before = revoked_before
+        self.expires = expires
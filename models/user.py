@@ -1,8 +1,7 @@
 # -*- coding: utf-8 -*-
 
-from passlib.hash import pbkdf2_sha256 as sha256
-
 from db import db
+from utils import hashing
 from .base_model import BaseModel
 
 
@@ -11,7 +10,7 @@ class UserModel(db.Model, BaseModel):
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True)
-    username = db.Column(db.String(80))
+    username = db.Column(db.String(80), unique=True, index=True)
     password = db.Column(
         db.String(256)
     )  # OJO: no podemos dejar de ponerle maxlength en SQLite a los campos de tabla
@@ -30,6 +29,19 @@ class UserModel(db.Model, BaseModel):
     def json(self):
         return {'id': self.id, 'username': self.username, 'name': self.name}
 
+    def verify_password(self, password):
+        """
+        Checks password against the stored hash. When it is right and the hash
+        was made with a different PBKDF2 cost than the configured one, the
+        hash is transparently upgraded and saved.
+        """
+        if not UserModel.verify_hash(password, self.password):
+            return False
+        if hashing.needs_rehash(self.password):
+            self.password = UserModel.generate_hash(password)
+            self.save_to_db()
+        return True
+
     # Class methods
     @classmethod
     def find_by_username(cls, username):
@@ -48,11 +60,11 @@ class UserModel(db.Model, BaseModel):
         except:
             return {'message': 'Something went wrong'}
 
-    # Static methods
+    # Static methods, hashing runs on the pool of utils/hashing.py
     @staticmethod
     def generate_hash(password):
-        return sha256.hash(password)
+        return hashing.hash_password(password)
 
     @staticmethod
     def verify_hash(password, hash):
-        return sha256.verify(password, hash)
+        return hashing.verify_password(password, hash)
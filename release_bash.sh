@@ -6,4 +6,7 @@ echo $VIRTUAL_ENV
 VENV=`pipenv --venv`
 echo $VENV
 
+# Migrating the database schema before the new release starts
+FLASK_APP=run.py flask db upgrade || exit $?
+
 gunicorn --check-config run
\ No newline at end of file
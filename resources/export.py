@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+resources/export.py
+
+Module that contains the api resource streaming full dumps of the catalog
+(items and stores) for downstream systems.
+"""
+from flask import Response, request, stream_with_context
+from flask_jwt_extended import jwt_required
+from flask_restful import Resource, abort, reqparse
+
+from utils.catalog_export import EXPORTS, FORMATS, iter_export
+from utils.replicas import read_from_replica
+
+
+class CatalogExport(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument(
+        'format', choices=tuple(FORMATS), default='ndjson', location='args')
+    parser.add_argument('store_id', type=int, location='args')
+
+    @jwt_required
+    @read_from_replica
+    def get(self, kind):
+        """Streams all the items or stores
+        Rows are sent as they are read from the database, gzipped on the fly
+        when the client accepts it (Accept-Encoding: gzip).
+        ---
+        tags:
+          - Export
+        parameters:
+          - in: path
+            name: kind
+            required: true
+            type: string
+            enum: [items, stores]
+          - in: query
+            name: format
+            type: string
+            enum: [ndjson, csv]
+            default: ndjson
+          - in: query
+            name: store_id
+            type: integer
+            description: Exports only the items of this store, or this store
+        responses:
+          200:
+            description: One item or store per line, with a header line in CSV
+          401:
+            description: Authorization required
+          404:
+            description: Unknown kind of rows
+        """
+        if kind not in EXPORTS:
+            abort(404, message='Nothing to export as {}'.format(kind))
+        args = CatalogExport.parser.parse_args()
+        gzip = 'gzip' in request.accept_encodings
+
+        response = Response(
+            stream_with_context(
+                iter_export(kind, args['format'], args['store_id'], gzip)),
+            mimetype=FORMATS[args['format']])
+        response.headers['Content-Disposition'] = \
+            'attachment; filename={}.{}'.format(kind, args['format'])
+        response.vary.add('Accept-Encoding')
+        if gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
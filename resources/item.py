@@ -4,12 +4,16 @@ resources/item.py
 
 Module that contains api resources regarding items information management.
 """
+from flask import after_this_request, current_app, request
 from flask_jwt_extended import jwt_required, jwt_optional, get_jwt_identity, fresh_jwt_required, get_jwt_claims
 from flask_restful import Resource, reqparse
 from twilio.base.exceptions import TwilioRestException
 
 from models.item import ItemModel
 from utils import notifications
+from utils.item_import import ImportFormatError, import_items, iter_records
+from utils.pagination import list_response, parse_page_args
+from utils.replicas import read_from_replica
 
 
 class ItemResource(Resource):
@@ -24,6 +28,7 @@ class ItemResource(Resource):
         'store_id', type=int, required=True, help="Every item needs a store!")
 
     @jwt_required
+    @read_from_replica
     def get(self, name):
         item = ItemModel.find_by_name(name)
         if item:
@@ -175,12 +180,29 @@ class ItemResource(Resource):
 
 class ItemListResource(Resource):
     @jwt_optional
+    @read_from_replica
     def get(self):
         """
-        Returns the list of items in the store
+        Returns a page of the list of items in the store
+        When there are more items, the X-Next-Cursor header has the value of
+        `after` for the next page, and the Link header its url.
         ---
         tags:
           - Items
+        parameters:
+          - name: limit
+            in: query
+            type: integer
+            description: Number of rows of the page (API_PAGE_SIZE by default, API_MAX_PAGE_SIZE at most)
+          - name: after
+            in: query
+            type: integer
+            description: Returns the rows following the one with this id, the X-Next-Cursor header of the previous page
+          - name: paginate
+            in: query
+            type: boolean
+            default: true
+            description: false streams the whole list in one response
         definitions:
           Item:
             type: object
@@ -208,14 +230,86 @@ class ItemListResource(Resource):
               { 'items' : [{'id': 1, 'name': 'New Item', 'store_id': 2},]}
         """
 
+        limit, after = parse_page_args()
         # Access the identity of the current user identity (username) with get_jwt_identity
         current_user = get_jwt_identity()
-        # same as: {'items': list(map(lambda x: x.json(), ItemModel.query.all()))}
-        items = [item.json() for item in ItemModel.find_all()]
         if current_user:
-            return {'items': items}
+            return list_response(ItemModel, 'items', limit, after)
+
+        return list_response(
+            ItemModel,
+            'items',
+            limit,
+            after,
+            query=ItemModel.query_fields('name'),
+            to_json=lambda item: item.name,
+            message='More data available if logged in')
+
+
+class ItemBulkResource(Resource):
+    @jwt_required
+    def post(self):
+        """Creates many items at once
+        The body is read as it is received, in NDJSON (application/x-ndjson),
+        CSV with a name,price,store_id header (text/csv) or as a JSON array
+        (application/json) of items. Valid items are inserted in batches of
+        ITEM_IMPORT_BATCH_SIZE; invalid ones are reported with their row
+        number and skipped. One notification sums the import up, once the
+        response is sent.
+        ---
+        tags:
+          - Items
+        consumes:
+          - application/x-ndjson
+          - text/csv
+          - application/json
+        parameters:
+          - in: body
+            name: body
+            schema:
+              type: array
+              items:
+                $ref: '#/definitions/Item'
+        responses:
+          200:
+            description: Numbers of inserted and failed items, with the errors
+          401:
+            description: Authorization required
+          415:
+            description: Unsupported content type
+        """
+        try:
+            records = iter_records(request.stream, request.mimetype)
+        except ImportFormatError as ex:
+            return {'message': str(ex)}, 415
+
+        stats = import_items(
+            records,
+            batch_size=current_app.config['ITEM_IMPORT_BATCH_SIZE'],
+            max_errors=current_app.config['ITEM_IMPORT_MAX_ERRORS'])
+
+        if stats['inserted']:
+            current_user = get_jwt_identity()
+            app = current_app._get_current_object()
+
+            def notify():
+                # A failed notification does not undo the committed items
+                with app.app_context():
+                    try:
+                        notifications.NotificationDispatcher.send_sms(
+                            from_name=current_user,
+                            to_phone='+12106105564',
+                            to_name='Alex',
+                            text='{} new items were added, {} rejected.'.
+                            format(stats['inserted'], stats['failed']))
+                    except Exception as ex:
+                        app.logger.warning(
+                            'Bulk import notification failed: {}'.format(ex))
+
+            @after_this_request
+            def notify_on_close(response):
+                # Sent after the body, the client does not wait for Twilio
+                response.call_on_close(notify)
+                return response
 
-        return {
-            'items': list(map(lambda x: x['name'], items)),
-            'message': 'More data available if logged in'
-        }
+        return stats
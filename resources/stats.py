@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+resources/stats.py
+
+Module that contains api resources exposing runtime statistics of the worker
+that serves the request.
+"""
+import os
+
+from flask import current_app
+from flask_jwt_extended import jwt_required, get_jwt_claims
+from flask_restful import Resource
+
+from db import db
+from utils.blacklist_helpers import revocation_cache_stats, token_writer_stats
+from utils.db_pool import pool_stats
+from utils.jwt_cache import decode_cache_stats
+from utils.replicas import replica_stats
+from utils.user_loader import user_cache_stats
+
+
+class CacheStats(Resource):
+    @jwt_required
+    def get(self):
+        """
+        Returns the size and hit/miss counters of the in-process caches
+        Every worker has its own caches, the numbers are those of the worker
+        that serves the request.
+        ---
+        tags:
+          - Stats
+        responses:
+          200:
+            description: The statistics of the users, revoked tokens and decoded tokens caches, the lag of the read replicas and the queue and failures of the token writer
+          401:
+            description: Authorization required
+          403:
+            description: Admin privilege required
+        """
+        claims = get_jwt_claims()
+        if not claims['is_admin']:
+            return {'message': 'Admin privilege required'}, 403
+
+        return {
+            'users': user_cache_stats(),
+            'revoked_tokens': revocation_cache_stats(),
+            'decoded_tokens': decode_cache_stats(),
+            'replicas': replica_stats(),
+            'token_writer': token_writer_stats()
+        }
+
+
+class PoolStats(Resource):
+    @jwt_required
+    def get(self):
+        """
+        Returns the state of the database connection pools of the worker
+        Every worker (pid) has its own pools, one per database (default and
+        replica binds). Size them so that workers x (size + max_overflow)
+        stays below the max_connections of the server.
+        ---
+        tags:
+          - Stats
+        responses:
+          200:
+            description: Size, checked out and overflow connections, checkout waits histogram (ms) and timeouts of every pool
+          401:
+            description: Authorization required
+          403:
+            description: Admin privilege required
+        """
+        claims = get_jwt_claims()
+        if not claims['is_admin']:
+            return {'message': 'Admin privilege required'}, 403
+
+        pools = {'default': pool_stats(db.get_engine(current_app).pool)}
+        for bind in current_app.config.get('SQLALCHEMY_BINDS') or {}:
+            pools[bind] = pool_stats(
+                db.get_engine(current_app, bind=bind).pool)
+        return {'pid': os.getpid(), 'pools': pools}
@@ -9,10 +9,13 @@ from flask_jwt_extended import jwt_required, get_jwt_claims, get_jwt_identity, j
 from flask_restful import Resource, abort
 
 from models.store import StoreModel
+from utils.pagination import list_response, parse_page_args
+from utils.replicas import read_from_replica
 
 
 class StoreResource(Resource):
     @jwt_required
+    @read_from_replica
     def get(self, name):
         """Endpoint that returns a store by its name. Required JWT authenticated user before proceed with the request
         This is using docstrings for specifications.
@@ -132,12 +135,29 @@ class StoreResource(Resource):
 
 class StoreListResource(Resource):
     @jwt_optional
+    @read_from_replica
     def get(self):
         """
-        Returns the list of stores
+        Returns a page of the list of stores
+        When there are more stores, the X-Next-Cursor header has the value of
+        `after` for the next page, and the Link header its url.
         ---
         tags:
           - Stores
+        parameters:
+          - name: limit
+            in: query
+            type: integer
+            description: Number of rows of the page (API_PAGE_SIZE by default, API_MAX_PAGE_SIZE at most)
+          - name: after
+            in: query
+            type: integer
+            description: Returns the rows following the one with this id, the X-Next-Cursor header of the previous page
+          - name: paginate
+            in: query
+            type: boolean
+            default: true
+            description: false streams the whole list in one response
         definitions:
           Store:
             type: object
@@ -183,13 +203,22 @@ class StoreListResource(Resource):
               stores: [{'id': 1, 'name': 'New Store', 'items': []},]
         """
 
+        limit, after = parse_page_args()
         # Access the identity of the current user identity (username) with get_jwt_identity
         current_user = get_jwt_identity()
-        stores = [store.json() for store in StoreModel.find_all()]
         if current_user:
-            return {'stores': stores}
-
-        return {
-            'stores': list(map(lambda x: x['name'], stores)),
-            'message': 'More data available if logged in'
-        }
+            return list_response(
+                StoreModel,
+                'stores',
+                limit,
+                after,
+                query=StoreModel.query_with_items())
+
+        return list_response(
+            StoreModel,
+            'stores',
+            limit,
+            after,
+            query=StoreModel.query_fields('name'),
+            to_json=lambda store: store.name,
+            message='More data available if logged in')
@@ -3,9 +3,13 @@ from flask import jsonify, current_app, request
 from flask_jwt_extended import (jwt_required, create_access_token, get_current_user, set_access_cookies, \
                                 jwt_refresh_token_required, get_jwt_identity, get_csrf_token, get_jwt_claims,
                                 fresh_jwt_required)
-from flask_restful import Resource
+from flask_restful import Resource, inputs
 
+from models.token import TokenModel
+from utils import pagination
 from utils.blacklist_helpers import add_token_to_database, get_user_tokens, prune_database
+from utils.replicas import read_from_replica
+from utils.streaming import json_array_response
 
 
 class TokenRefresh(Resource):
@@ -73,22 +77,62 @@ class TokenList(Resource):
     """Api resource that enables to see the JWT for a user
 
     """
+    parser = pagination.parser.copy()
+    parser.add_argument('revoked', type=inputs.boolean, location='args')
+    parser.add_argument(
+        'token_type', choices=('access', 'refresh'), location='args')
 
     @jwt_required
+    @read_from_replica
     def get(self):
         """
-        Returns the list of tokens for the current user
+        Returns a page of the tokens for the current user, in id order
+        The body is streamed. When there are more tokens, the X-Next-Cursor
+        header has the value of `after` for the next page, and the Link header
+        its url.
         ---
         tags:
           - Auth
+        parameters:
+          - name: limit
+            in: query
+            type: integer
+            description: Number of tokens of the page (API_PAGE_SIZE by default, API_MAX_PAGE_SIZE at most)
+          - name: after
+            in: query
+            type: integer
+            description: Returns the tokens following the one with this token_id
+          - name: revoked
+            in: query
+            type: boolean
+            description: Returns only the revoked (true) or unrevoked (false) tokens
+          - name: token_type
+            in: query
+            type: string
+            enum: [access, refresh]
         responses:
           200:
             description: The list of tokens for the current logged user.
+          400:
+            description: Invalid query parameters
         """
-        user_identity = get_jwt_identity()
-        all_tokens = get_user_tokens(user_identity)
-        ret = [token.json() for token in all_tokens]
-        return jsonify(ret)
+        args = TokenList.parser.parse_args()
+        limit = pagination.page_limit(args['limit'])
+        tokens = get_user_tokens(
+            get_jwt_identity(),
+            after=args['after'],
+            revoked=args['revoked'],
+            token_type=args['token_type'])
+
+        # The ids at the end of the page, from the index, tell if there is
+        # a next page before the page itself is streamed
+        boundary = tokens.with_entities(TokenModel.id).offset(limit -
+                                                              1).limit(2).all()
+        cursor = boundary[0].id if len(boundary) == 2 else None
+
+        return json_array_response(
+            tokens.limit(limit).yield_per(100),
+            headers=pagination.next_page_headers(cursor, limit))
 
     @fresh_jwt_required
     def delete(self):
@@ -99,7 +143,7 @@ class TokenList(Resource):
           - Auth
         responses:
           200:
-            description: Expired tokens deleted
+            description: Expired tokens deleted, with the number of deleted rows and rows/sec
           401:
             description: Authorization required
           403:
@@ -110,5 +154,6 @@ class TokenList(Resource):
         if not claims['is_admin']:
             return {'message': 'Admin privilege required'}, 403
 
-        prune_database()
-        return jsonify({'message': 'Expired tokens deleted'})
+        stats = prune_database(current_app.config['TOKEN_PRUNE_BATCH_SIZE'])
+        stats['message'] = 'Expired tokens deleted'
+        return jsonify(stats)
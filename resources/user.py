@@ -15,7 +15,11 @@ from flask_restful import Resource, reqparse, abort
 
 from exception import TokenNotFound
 from models.user import UserModel
-from utils.blacklist_helpers import add_token_to_database, revoke_token
+from utils.pagination import list_response, parse_page_args
+from utils.replicas import read_from_replica
+from utils.blacklist_helpers import (add_tokens_to_database, revoke_token,
+                                     revoke_user_tokens)
+from utils.user_loader import clear_users, invalidate_user
 
 
 class UserResource(Resource):
@@ -70,6 +74,7 @@ class UserResource(Resource):
         user = UserModel.find_by_username(username)
         if user:
             user.delete_from_db()
+            invalidate_user(username)
         return {'message': 'User deleted'}
 
     # @classmethod
@@ -206,8 +211,7 @@ class UserLogin(Resource):
         data = UserLogin.parser.parse_args()
         current_user = UserModel.find_by_username(data['username'])
 
-        if current_user and UserModel.verify_hash(data['password'],
-                                                  current_user.password):
+        if current_user and current_user.verify_password(data['password']):
 
             # create_access_token supports an optional 'fresh' argument,
             # which marks the token as fresh or non-fresh accordingly.
@@ -218,10 +222,8 @@ class UserLogin(Resource):
             refresh_token = create_refresh_token(identity=current_user)
 
             # Store the tokens in our store with a status of not currently revoked.
-            add_token_to_database(access_token,
-                                  current_app.config['JWT_IDENTITY_CLAIM'])
-            add_token_to_database(refresh_token,
-                                  current_app.config['JWT_IDENTITY_CLAIM'])
+            add_tokens_to_database([access_token, refresh_token],
+                                   current_app.config['JWT_IDENTITY_CLAIM'])
 
             raw_response = {
                 'message': 'Logged in as {}'.format(current_user.username),
@@ -270,13 +272,30 @@ class AllUsers(Resource):
     """
 
     @jwt_optional
+    @read_from_replica
     def get(self):
         """
-        Returns the list of users
+        Returns a page of the list of users
         For testing purposes only, in production should be deactivated
+        When there are more users, the X-Next-Cursor header has the value of
+        `after` for the next page, and the Link header its url.
         ---
         tags:
           - Users
+        parameters:
+          - name: limit
+            in: query
+            type: integer
+            description: Number of rows of the page (API_PAGE_SIZE by default, API_MAX_PAGE_SIZE at most)
+          - name: after
+            in: query
+            type: integer
+            description: Returns the rows following the one with this id, the X-Next-Cursor header of the previous page
+          - name: paginate
+            in: query
+            type: boolean
+            default: true
+            description: false streams the whole list in one response
         responses:
           200:
             description: The list of users
@@ -299,16 +318,21 @@ class AllUsers(Resource):
                 'is_admin': x.is_admin
             }
 
+        limit, after = parse_page_args()
         # Access the identity of the current user identity (username) with get_jwt_identity
         current_user = get_jwt_identity()
-        users = list(map(lambda x: to_json(x), UserModel.find_all()))
         if current_user:
-            return {'users': users}
-
-        return {
-            'users': [x['name'] for x in users],
-            'message': 'More data available if logged in'
-        }
+            return list_response(
+                UserModel, 'users', limit, after, to_json=to_json)
+
+        return list_response(
+            UserModel,
+            'users',
+            limit,
+            after,
+            query=UserModel.query_fields('name'),
+            to_json=lambda x: x.name,
+            message='More data available if logged in')
 
     @jwt_required
     def delete(self):
@@ -326,7 +350,9 @@ class AllUsers(Resource):
 
         if not claims['is_admin']:
             return {'message': 'Forbidden: Admin privilege required'}, 403
-        return UserModel.delete_all()
+        response = UserModel.delete_all()
+        clear_users()
+        return response
 
 
 # Because the JWTs are stored in an httponly cookie now, we cannot
@@ -350,9 +376,9 @@ class UserLogoutAccess(Resource):
         """
 
         user_identity = get_jwt_identity()
-        jti = get_raw_jwt()['jti']
+        raw_jwt = get_raw_jwt()
         try:
-            revoke_token(jti, user_identity)
+            revoke_token(raw_jwt['jti'], user_identity, raw_jwt)
         except TokenNotFound:
             resp = jsonify({'message': 'The specified token was not found'})
             resp.status_code = 404
@@ -383,9 +409,9 @@ class UserLogoutRefresh(Resource):
         """
 
         user_identity = get_jwt_identity()
-        jti = get_raw_jwt()['jti']
+        raw_jwt = get_raw_jwt()
         try:
-            revoke_token(jti, user_identity)
+            revoke_token(raw_jwt['jti'], user_identity, raw_jwt)
         except TokenNotFound:
             resp = jsonify({'message': 'The specified token was not found'})
             resp.status_code = 404
@@ -398,3 +424,31 @@ class UserLogoutRefresh(Resource):
             unset_jwt_cookies(resp)
 
         return resp
+
+
+class UserLogoutAll(Resource):
+    @jwt_required
+    def delete(self):
+        """Logout a user from every device.
+        By sending an order to the browser to unset the cookie with the JWTs saved,
+        and revoking all the active tokens (access and refresh) of the user at once.
+        ---
+        tags:
+          - Auth
+        responses:
+          200:
+            description: User logged out, with the number of revoked tokens
+        """
+
+        user_identity = get_jwt_identity()
+        revoked = revoke_user_tokens(user_identity, get_raw_jwt())
+
+        resp = jsonify({
+            'message': 'Successfully logged out',
+            'logout': True,
+            'revoked': revoked
+        })
+        resp.status_code = 200
+        unset_jwt_cookies(resp)
+
+        return resp
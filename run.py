@@ -1,12 +1,30 @@
 # -*- coding: utf-8 -*-
+from utils import gevent_support
+
+# Under a gevent worker psycopg2 waits for PostgreSQL on the event loop, before
+# anything opens a connection
+gevent_support.install()
+
+from flask_migrate import Migrate
+
 from app import flaskApp as application
 from db import db
+from utils.token_pruner import TokenPruner
 
 
 # Flask app configuration
 db.init_app(application)
+# Schema migrations of existing databases: FLASK_APP=run.py flask db upgrade
+migrate = Migrate(application, db)
 
 @application.before_first_request
 def create_tables():
     db.create_all()
 
+
+if application.config['TOKEN_PRUNE_INTERVAL']:
+    TokenPruner(
+        application,
+        interval=application.config['TOKEN_PRUNE_INTERVAL'],
+        batch_size=application.config['TOKEN_PRUNE_BATCH_SIZE'],
+        pause=application.config['TOKEN_PRUNE_PAUSE']).start()
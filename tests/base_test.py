@@ -7,10 +7,12 @@ It allows for instantiation of the database dynamically,
 and makes sure that it is a new, blank database each time.
 """
 
+from contextlib import contextmanager
 from unittest import TestCase
 
 from app import flaskApp, default_db_uri
 from db import db
+from utils.query_stats import recorded_queries
 
 
 class BaseTest(TestCase):
@@ -58,3 +60,23 @@ class BaseTest(TestCase):
         with flaskApp.app_context():
             db.session.remove()
             db.drop_all()
+        # And so are the in-process caches of its rows
+        flaskApp.extensions.pop('users_cache', None)
+        flaskApp.extensions.pop('token_cutoffs', None)
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries, tables=None):
+        """
+        Fails if the with block runs more than max_queries SQL statements,
+        counting only those reading FROM one of tables if given. The
+        statements counted are in the list it returns.
+        """
+        counted = []
+        with recorded_queries() as statements:
+            yield counted
+        counted.extend(
+            statement for statement in statements if tables is None or any(
+                'FROM ' + table in statement for table in tables))
+        if len(counted) > max_queries:
+            self.fail('{} SQL statements run, {} expected at most:\n{}'.format(
+                len(counted), max_queries, '\n'.join(counted)))
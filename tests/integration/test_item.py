@@ -42,3 +42,20 @@ class ItemTest(BaseTest):
             item = ItemModel('item1', 19.99, 1)
             item.save_to_db()
             self.assertEqual('store', item.store.name)
+
+    def test_query_fields(self):
+        """
+        Tests that query_fields returns the id and the requested columns only
+        :return:
+        """
+        with self.app_context():
+            StoreModel('store').save_to_db()
+            ItemModel('item1', 19.99, 1).save_to_db()
+            ItemModel('item2', 9.99, 1).save_to_db()
+
+            rows, cursor = ItemModel.find_page(
+                1, query=ItemModel.query_fields('name'))
+            self.assertEqual([(1, 'item1')], rows)
+            self.assertEqual('item1', rows[0].name)
+            self.assertEqual(1, cursor)
+            self.assertNotIsInstance(rows[0], ItemModel)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+MigrationsTest
+Class tested: the Alembic migrations in the migrations folder
+
+Only test methods that depends on databases or work with other classes and methods of your app
+"""
+import os
+
+from flask_migrate import Migrate, downgrade, upgrade
+from sqlalchemy import inspect
+
+from app import flaskApp
+from db import db
+from tests.base_test import BaseTest
+
+MIGRATIONS = os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir, 'migrations')
+
+
+class MigrationsTest(BaseTest):
+    @classmethod
+    def setUpClass(cls):
+        super(MigrationsTest, cls).setUpClass()
+        Migrate(flaskApp, db, directory=MIGRATIONS)
+
+    def tearDown(self):
+        with self.app_context():
+            db.session.execute('DROP TABLE IF EXISTS alembic_version')
+        super(MigrationsTest, self).tearDown()
+
+    def _indexes(self, table):
+        return {index['name'] for index in inspect(db.engine).get_indexes(table)}
+
+    def test_upgrade_adds_lookup_indexes(self):
+        with self.app_context():
+            # A database created before the indexes were in the models
+            db.session.execute('DROP INDEX ix_users_username')
+            db.session.execute('DROP INDEX ix_items_store_id_name')
+            db.session.commit()
+
+            # The indexes created by db.create_all() are kept as they are
+            upgrade(directory=MIGRATIONS)
+            self.assertIn('ix_users_username', self._indexes('users'))
+            self.assertIn('ix_items_store_id_name', self._indexes('items'))
+            self.assertIn('ix_revoked_tokens_jti',
+                          self._indexes('revoked_tokens'))
+
+            downgrade(directory=MIGRATIONS, revision='base')
+            self.assertNotIn('ix_users_username', self._indexes('users'))
+
+            upgrade(directory=MIGRATIONS)
+            self.assertIn('ix_users_username', self._indexes('users'))
+
+    def test_upgrade_adds_token_cutoffs(self):
+        with self.app_context():
+            # A database created before the table was in the models
+            db.session.execute('DROP TABLE token_cutoffs')
+            db.session.commit()
+
+            upgrade(directory=MIGRATIONS)
+            self.assertIn('ix_token_cutoffs_created',
+                          self._indexes('token_cutoffs'))
+
+            downgrade(directory=MIGRATIONS, revision='a1f3c2d9e4b0')
+            self.assertNotIn('token_cutoffs',
+                             inspect(db.engine).get_table_names())
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+TokenTest
+Class tested: TokenModel and the helpers in utils/blacklist_helpers.py
+
+Only test methods that depends on databases or work with other classes and methods of your app
+"""
+from datetime import datetime, timedelta
+from unittest import mock
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, decode_token
+
+from app import flaskApp
+from db import db
+from exception import TokenWriteError
+from models.token import TokenModel, TokenEventModel
+from models.user import UserModel
+from tests.base_test import BaseTest
+from utils.blacklist_helpers import (add_token_to_database, flush_token_writer,
+                                     get_user_tokens,
+                                     is_token_revoked, prune_database,
+                                     revoke_token, revoke_user_tokens,
+                                     unrevoke_token)
+
+
+class TokenTest(BaseTest):
+    def setUp(self):
+        super(TokenTest, self).setUp()
+        # Every test starts like a freshly spawned worker
+        self.poll_interval = flaskApp.config['JWT_REVOCATION_POLL_INTERVAL']
+        flaskApp.config['JWT_REVOCATION_POLL_INTERVAL'] = 0
+        flaskApp.extensions.pop('revoked_tokens_cache', None)
+        flaskApp.extensions.pop('revoked_jtis_filter', None)
+
+    def tearDown(self):
+        flaskApp.config['JWT_REVOCATION_POLL_INTERVAL'] = self.poll_interval
+        flaskApp.config['JWT_TOKEN_STORAGE'] = 'all'
+        flaskApp.config['JWT_TOKEN_WRITE_BEHIND'] = False
+        flaskApp.config['JWT_TOKEN_WRITE_INTERVAL_MS'] = 50
+        flaskApp.config['JWT_MAX_TOKENS_PER_USER'] = 0
+        writer = flaskApp.extensions.pop('token_writer', None)
+        if writer is not None:
+            writer.stop()
+        super(TokenTest, self).tearDown()
+
+    def _issue_token(self):
+        user = UserModel.find_by_username('alexmtnezf')
+        if user is None:
+            user = UserModel('Alex', 'alexmtnezf', '1234', is_admin=True)
+            user.save_to_db()
+        access_token = create_access_token(identity=user, fresh=True)
+        add_token_to_database(access_token,
+                              current_app.config['JWT_IDENTITY_CLAIM'])
+        return decode_token(access_token)
+
+    def test_revocation_is_cached(self):
+        with self.app_context():
+            decoded_token = self._issue_token()
+            self.assertFalse(is_token_revoked(decoded_token))
+
+            # The cached state is served without touching revoked_tokens
+            db.session.query(TokenModel).delete()
+            db.session.commit()
+            self.assertFalse(is_token_revoked(decoded_token))
+
+    def test_revoke_invalidates_cache(self):
+        with self.app_context():
+            decoded_token = self._issue_token()
+            self.assertFalse(is_token_revoked(decoded_token))
+
+            revoke_token(decoded_token['jti'], decoded_token['identity'])
+            self.assertTrue(is_token_revoked(decoded_token))
+
+            token = TokenModel.find_by(jti=decoded_token['jti']).one()
+            unrevoke_token(token.id, decoded_token['identity'])
+            self.assertFalse(is_token_revoked(decoded_token))
+
+    def test_unknown_token_is_revoked(self):
+        with self.app_context():
+            decoded_token = self._issue_token()
+            decoded_token['jti'] = 'unknown-jti'
+            self.assertTrue(is_token_revoked(decoded_token))
+
+    def test_revocation_from_another_worker(self):
+        with self.app_context():
+            decoded_token = self._issue_token()
+            self.assertFalse(is_token_revoked(decoded_token))
+
+            # Another worker revokes the token, leaving this cache stale
+            token = TokenModel.find_by(jti=decoded_token['jti']).one()
+            token.revoked = True
+            db.session.add(TokenEventModel(token.jti, True, token.expires))
+            db.session.commit()
+
+            self.assertTrue(is_token_revoked(decoded_token))
+
+    def test_revoke_user_tokens(self):
+        with self.app_context():
+            decoded_tokens = [self._issue_token() for _ in range(3)]
+            self.assertFalse(is_token_revoked(decoded_tokens[0]))
+
+            self.assertEqual(3, revoke_user_tokens('alexmtnezf'))
+            self.assertEqual(3, TokenEventModel.query.count())
+            for decoded_token in decoded_tokens:
+                self.assertTrue(is_token_revoked(decoded_token))
+            self.assertEqual(0, revoke_user_tokens('alexmtnezf'))
+
+    def test_tokens_per_user_cap(self):
+        with self.app_context():
+            flaskApp.config['JWT_MAX_TOKENS_PER_USER'] = 2
+            decoded_tokens = [self._issue_token() for _ in range(3)]
+
+            # The oldest token is evicted, and so it is revoked
+            self.assertEqual(2, TokenModel.query.count())
+            self.assertTrue(is_token_revoked(decoded_tokens[0]))
+            self.assertFalse(is_token_revoked(decoded_tokens[1]))
+            self.assertFalse(is_token_revoked(decoded_tokens[2]))
+
+    def test_revoked_only_storage(self):
+        with self.app_context():
+            flaskApp.config['JWT_TOKEN_STORAGE'] = 'revoked'
+            decoded_token = self._issue_token()
+
+            # Issued tokens are not stored, and they are not revoked
+            self.assertEqual(0, TokenModel.query.count())
+            self.assertFalse(is_token_revoked(decoded_token))
+
+            revoke_token(decoded_token['jti'], decoded_token['identity'],
+                         decoded_token)
+            self.assertEqual(1, TokenModel.query.count())
+            self.assertTrue(is_token_revoked(decoded_token))
+
+            # A fresh worker rebuilds its filter from the table
+            flaskApp.extensions.pop('revoked_tokens_cache')
+            flaskApp.extensions.pop('revoked_jtis_filter')
+            self.assertTrue(is_token_revoked(decoded_token))
+
+    def test_write_behind_reads_queued_tokens(self):
+        with self.app_context():
+            flaskApp.config['JWT_TOKEN_WRITE_BEHIND'] = True
+            flaskApp.config['JWT_TOKEN_WRITE_INTERVAL_MS'] = 1000
+            decoded_token = self._issue_token()
+
+            # Still queued: not in the table, but not reported as revoked
+            flaskApp.extensions['revoked_tokens_cache'].clear()
+            self.assertEqual(0, TokenModel.query.count())
+            self.assertFalse(is_token_revoked(decoded_token))
+
+            flush_token_writer()
+            self.assertEqual(1, TokenModel.query.count())
+            self.assertIsNone(flaskApp.extensions['token_writer'].pending(
+                decoded_token['jti']))
+
+    def _unwritten_token(self):
+        # Issued by another worker: queued there, unknown here
+        user = UserModel('Alex', 'alexmtnezf', '1234', is_admin=True)
+        user.save_to_db()
+        return decode_token(create_access_token(identity=user, fresh=True))
+
+    def test_write_behind_accepts_recent_unknown_tokens(self):
+        with self.app_context():
+            decoded_token = self._unwritten_token()
+            self.assertTrue(is_token_revoked(decoded_token))
+
+            flaskApp.config['JWT_TOKEN_WRITE_BEHIND'] = True
+            self.assertFalse(is_token_revoked(decoded_token))
+            # Past the grace period it should have been written
+            grace = flaskApp.config['JWT_TOKEN_WRITE_GRACE']
+            decoded_token['iat'] -= grace + 1
+            self.assertTrue(is_token_revoked(decoded_token))
+
+    def test_write_behind_revokes_unwritten_tokens(self):
+        with self.app_context():
+            flaskApp.config['JWT_TOKEN_WRITE_BEHIND'] = True
+            decoded_token = self._unwritten_token()
+            revoke_token(decoded_token['jti'], decoded_token['identity'],
+                         decoded_token)
+            self.assertTrue(is_token_revoked(decoded_token))
+
+            # The writer of the worker that issued it keeps the revoked row
+            writer = flaskApp.extensions['token_writer']
+            other = dict(decoded_token, jti='other-jti')
+            writer.put([{
+                'jti': token['jti'],
+                'token_type': 'access',
+                'user_identity': token['identity'],
+                'expires': datetime.utcnow() + timedelta(minutes=15),
+                'revoked': False
+            } for token in (decoded_token, other)])
+            flush_token_writer()
+            self.assertTrue(TokenModel.find_by(
+                jti=decoded_token['jti']).one().revoked)
+            self.assertFalse(TokenModel.find_by(jti='other-jti').one().revoked)
+
+    def test_write_behind_logout_everywhere_revokes_queued_tokens(self):
+        with self.app_context():
+            flaskApp.config['JWT_TOKEN_WRITE_BEHIND'] = True
+            decoded_token = self._unwritten_token()
+            self.assertFalse(is_token_revoked(decoded_token))
+
+            self.assertEqual(0, revoke_user_tokens('alexmtnezf'))
+            self.assertTrue(is_token_revoked(decoded_token))
+
+            # The worker that issued it writes it unrevoked afterwards
+            for jti in (decoded_token['jti'], 'later-jti'):
+                TokenModel(jti, 'access', 'alexmtnezf',
+                           datetime.utcnow() + timedelta(minutes=15),
+                           False).save_to_db()
+            flaskApp.extensions.pop('revoked_tokens_cache')
+            flaskApp.extensions.pop('token_cutoffs')
+            self.assertTrue(is_token_revoked(decoded_token))
+
+            # Tokens issued after the logout are not revoked
+            cutoff = flaskApp.extensions['token_cutoffs']['alexmtnezf']
+            later = dict(decoded_token, jti='later-jti', iat=cutoff + 1)
+            self.assertFalse(is_token_revoked(later))
+
+            # The cutoff is kept until the tokens it covers expire
+            self.assertEqual(0, prune_database()['deleted'])
+            self.assertTrue(is_token_revoked(decoded_token))
+
+    def test_write_behind_keeps_failed_batches(self):
+        with self.app_context():
+            flaskApp.config['JWT_TOKEN_WRITE_BEHIND'] = True
+            with mock.patch('utils.token_writer.TokenWriter._insert',
+                            side_effect=RuntimeError('database is down')):
+                decoded_token = self._issue_token()
+                writer = flaskApp.extensions['token_writer']
+                with self.assertRaises(TokenWriteError):
+                    flush_token_writer()
+                # Not lost: still valid in this worker, and retried
+                self.assertEqual(1, writer.stats()['failed'])
+                self.assertEqual('database is down', writer.last_error)
+                flaskApp.extensions['revoked_tokens_cache'].clear()
+                self.assertFalse(is_token_revoked(decoded_token))
+
+            flush_token_writer()
+            self.assertEqual(1, TokenModel.query.count())
+            self.assertEqual(0, writer.stats()['failed'])
+
+    def test_write_behind_failures_do_not_block_revocations(self):
+        with self.app_context():
+            flaskApp.config['JWT_TOKEN_WRITE_BEHIND'] = True
+            with mock.patch('utils.token_writer.TokenWriter._insert',
+                            side_effect=RuntimeError('database is down')):
+                decoded_tokens = [self._issue_token() for _ in range(3)]
+                writer = flaskApp.extensions['token_writer']
+                # Rows of other users are not waited for
+                writer.flush(lambda row: row['user_identity'] == 'other')
+                with self.assertLogs(flaskApp.logger, 'WARNING'):
+                    self.assertEqual(
+                        [], get_user_tokens('alexmtnezf').all())
+
+                with self.assertLogs(flaskApp.logger, 'WARNING'):
+                    revoke_token(decoded_tokens[0]['jti'], 'alexmtnezf')
+                with self.assertLogs(flaskApp.logger, 'WARNING'):
+                    self.assertEqual(2, revoke_user_tokens('alexmtnezf'))
+                for decoded_token in decoded_tokens:
+                    self.assertTrue(is_token_revoked(decoded_token))
+
+            # The writer skips the rows written revoked meanwhile
+            flush_token_writer()
+            self.assertEqual(0, writer.stats()['failed'])
+            self.assertEqual(
+                [True] * 3,
+                [token.revoked for token in TokenModel.query.all()])
+
+    def test_prune_database_in_batches(self):
+        with self.app_context():
+            self._issue_token()
+            for number in range(5):
+                TokenModel('expired-{}'.format(number), 'access', 'alexmtnezf',
+                           datetime.utcnow() - timedelta(minutes=1),
+                           False).save_to_db()
+
+            stats = prune_database(batch_size=2)
+            self.assertEqual(5, stats['deleted'])
+            self.assertEqual(1, TokenModel.query.count())
+
+    def test_prune_tokens_command(self):
+        with self.app_context():
+            TokenModel('expired', 'access', 'alexmtnezf',
+                       datetime.utcnow() - timedelta(minutes=1),
+                       False).save_to_db()
+
+            result = flaskApp.test_cli_runner().invoke(
+                args=['prune-tokens', '--batch-size', '10', '--pause', '0'])
+            self.assertIn('Pruned 1 expired tokens', result.output)
+            self.assertEqual(0, TokenModel.query.count())
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+import os
+import tempfile
+
+from app import flaskApp
+from models.item import ItemModel
+from models.store import StoreModel
+from models.user import UserModel
+from tests.base_test import BaseTest
+
+
+class ExportTest(BaseTest):
+    def setUp(self):
+        super(ExportTest, self).setUp()
+        with self.app_context():
+            with self.client() as client:
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                auth_resp = client.post(
+                    ExportTest.BASE_API_URL + '/auth',
+                    data=json.dumps({
+                        'username': 'alexmtnezf',
+                        'password': '1234'
+                    }),
+                    headers={'Content-Type': 'application/json'})
+                jwt_token = json.loads(
+                    auth_resp.data.decode('utf-8'))['access_token']
+                self.headers = {'Authorization': 'Bearer {}'.format(jwt_token)}
+
+                for store_id, store in enumerate(('store1', 'store2'), 1):
+                    StoreModel(store).save_to_db()
+                    for number in range(3):
+                        ItemModel('{}-item{}'.format(store, number), 9.99,
+                                  store_id).save_to_db()
+
+    def test_export_items_ndjson(self):
+        with self.app_context():
+            with self.client() as cl:
+                resp = cl.get(
+                    ExportTest.BASE_API_URL + '/export/items',
+                    headers=self.headers)
+                self.assertEqual(200, resp.status_code)
+                self.assertTrue(resp.is_streamed)
+                self.assertEqual('application/x-ndjson', resp.mimetype)
+                items = [
+                    json.loads(line)
+                    for line in resp.data.decode('utf-8').splitlines()
+                ]
+                self.assertEqual(6, len(items))
+                self.assertEqual({
+                    'id': 1,
+                    'name': 'store1-item0',
+                    'price': 9.99,
+                    'store_id': 1
+                }, items[0])
+
+    def test_export_items_of_store_csv_gzip(self):
+        with self.app_context():
+            with self.client() as cl:
+                resp = cl.get(
+                    ExportTest.BASE_API_URL +
+                    '/export/items?format=csv&store_id=2',
+                    headers=dict(self.headers, **{'Accept-Encoding': 'gzip'}))
+                self.assertEqual(200, resp.status_code)
+                self.assertEqual('gzip', resp.headers['Content-Encoding'])
+                lines = gzip.decompress(resp.data).decode('utf-8').splitlines()
+                self.assertEqual('id,name,price,store_id', lines[0])
+                self.assertEqual(['store2-item0', 'store2-item1', 'store2-item2'],
+                                 [line.split(',')[1] for line in lines[1:]])
+
+    def test_export_unknown_kind(self):
+        with self.app_context():
+            with self.client() as cl:
+                resp = cl.get(
+                    ExportTest.BASE_API_URL + '/export/users',
+                    headers=self.headers)
+                self.assertEqual(404, resp.status_code)
+
+    def test_export_catalog_command(self):
+        with self.app_context():
+            output = os.path.join(tempfile.mkdtemp(), 'stores.csv.gz')
+            result = flaskApp.test_cli_runner().invoke(args=[
+                'export-catalog', 'stores', '--format', 'csv', '--gzip',
+                '--output', output
+            ])
+            self.assertEqual(0, result.exit_code, result.output)
+            with gzip.open(output, 'rt') as dump:
+                self.assertEqual('id,name\n1,store1\n2,store2\n', dump.read())
+            os.remove(output)
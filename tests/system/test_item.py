@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import json
+from unittest import mock
 
+from app import flaskApp
 from models.item import ItemModel
 from models.store import StoreModel
 from models.user import UserModel
@@ -197,3 +199,138 @@ class ItemTest(BaseTest):
                         'store_id': 1
                     }]
                 }, json.loads(resp.data.decode('utf-8')))
+
+    def test_item_list_queries(self):
+        with self.app_context():
+            with self.client() as cl:
+                StoreModel('test').save_to_db()
+                for number in range(10):
+                    ItemModel('item{}'.format(number), 9.99, 1).save_to_db()
+
+                with self.assertMaxQueries(1, tables=('items', 'stores')):
+                    resp = cl.get(
+                        ItemTest.BASE_API_URL + '/items', headers=self.headers)
+                self.assertEqual(200, resp.status_code)
+                # Outside production the statements of the request are sent
+                self.assertGreaterEqual(int(resp.headers['X-DB-Queries']), 1)
+                self.assertRegex(resp.headers['Server-Timing'],
+                                 r'^db;dur=[0-9.]+;desc="[0-9]+ queries"$')
+
+    def test_queries_warning(self):
+        with self.app_context():
+            StoreModel('test').save_to_db()
+            flaskApp.config['DB_QUERY_WARN_COUNT'] = 1
+            try:
+                # Logged at the end of the request, when the client is closed
+                with self.assertLogs(flaskApp.logger, 'WARNING') as logs:
+                    with self.client() as cl:
+                        # The stores, then their items
+                        cl.get(ItemTest.BASE_API_URL + '/stores',
+                               headers=self.headers)
+            finally:
+                flaskApp.config['DB_QUERY_WARN_COUNT'] = 20
+            self.assertIn('GET /api/stores ran', logs.output[0])
+
+    def test_item_list_pages(self):
+        with self.app_context():
+            with self.client() as cl:
+                StoreModel('test').save_to_db()
+                for number in range(5):
+                    ItemModel('item{}'.format(number), 9.99, 1).save_to_db()
+
+                names = []
+                url = ItemTest.BASE_API_URL + '/items?limit=2'
+                while url:
+                    resp = cl.get(url, headers=self.headers)
+                    self.assertEqual(200, resp.status_code)
+                    page = json.loads(resp.data.decode('utf-8'))['items']
+                    self.assertLessEqual(len(page), 2)
+                    names.extend(item['name'] for item in page)
+                    url = resp.headers.get('Link', '')[1:].split('>')[0]
+
+                self.assertEqual(['item{}'.format(n) for n in range(5)], names)
+
+    def test_item_list_unpaginated(self):
+        with self.app_context():
+            with self.client() as cl:
+                StoreModel('test').save_to_db()
+                for number in range(3):
+                    ItemModel('item{}'.format(number), 9.99, 1).save_to_db()
+
+                resp = cl.get(
+                    ItemTest.BASE_API_URL + '/items?paginate=false&limit=1')
+                self.assertEqual(200, resp.status_code)
+                self.assertTrue(resp.is_streamed)
+                self.assertNotIn('X-Next-Cursor', resp.headers)
+                self.assertDictEqual({
+                    'items': ['item0', 'item1', 'item2'],
+                    'message': 'More data available if logged in'
+                }, json.loads(resp.data.decode('utf-8')))
+
+    def _import(self, client, body, content_type):
+        with mock.patch('utils.notifications.NotificationDispatcher.send_sms'
+                        ) as send_sms:
+            # buffered closes the response, which sends the notification
+            resp = client.post(
+                ItemTest.BASE_API_URL + '/items/bulk',
+                data=body,
+                headers=dict(self.headers, **{'Content-Type': content_type}),
+                buffered=True)
+        return resp, send_sms
+
+    def test_bulk_import_ndjson(self):
+        with self.app_context():
+            with self.client() as cl:
+                StoreModel('test').save_to_db()
+                ItemModel('existing', 1.0, 1).save_to_db()
+                lines = [
+                    json.dumps({'name': 'item{}'.format(n), 'price': n,
+                                'store_id': 1}) for n in range(5)
+                ]
+                lines += [
+                    '{"name": "no store", "price": 1, "store_id": 9}',
+                    '{"name": "existing", "price": 1, "store_id": 1}',
+                    '{"name": "no price", "store_id": 1}',
+                    'not json',
+                ]
+
+                flaskApp.config['ITEM_IMPORT_BATCH_SIZE'] = 2
+                try:
+                    resp, send_sms = self._import(cl, '\n'.join(lines),
+                                                  'application/x-ndjson')
+                finally:
+                    flaskApp.config['ITEM_IMPORT_BATCH_SIZE'] = 500
+                self.assertEqual(200, resp.status_code)
+                stats = json.loads(resp.data.decode('utf-8'))
+                self.assertEqual(5, stats['inserted'])
+                self.assertEqual(4, stats['failed'])
+                self.assertEqual([6, 7, 8, 9],
+                                 [error['row'] for error in stats['errors']])
+                # One notification for the whole import, not per batch
+                self.assertEqual(3, stats['batches'])
+                send_sms.assert_called_once()
+                self.assertEqual('5 new items were added, 4 rejected.',
+                                 send_sms.call_args[1]['text'])
+                self.assertEqual(6, ItemModel.query.count())
+
+    def test_bulk_import_csv_and_json(self):
+        with self.app_context():
+            with self.client() as cl:
+                StoreModel('test').save_to_db()
+                resp, _ = self._import(
+                    cl, 'name,price,store_id\nitem1,9.99,1\nitem2,abc,1\n',
+                    'text/csv')
+                stats = json.loads(resp.data.decode('utf-8'))
+                self.assertEqual((1, 1), (stats['inserted'], stats['failed']))
+                self.assertEqual('price must be a number',
+                                 stats['errors'][0]['message'])
+
+                resp, _ = self._import(
+                    cl, json.dumps([{'name': 'item3', 'price': 1.5,
+                                     'store_id': 1}]), 'application/json')
+                stats = json.loads(resp.data.decode('utf-8'))
+                self.assertEqual(1, stats['inserted'])
+                self.assertEqual(1.5, ItemModel.find_by_name('item3').price)
+
+                resp, _ = self._import(cl, 'item', 'text/plain')
+                self.assertEqual(415, resp.status_code)
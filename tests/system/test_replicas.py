@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from app import flaskApp
+from db import db
+from models.item import ItemModel
+from models.store import StoreModel
+from models.user import UserModel
+from tests.base_test import BaseTest
+from utils import replicas
+
+
+class ReplicaTest(BaseTest):
+    """
+    The primary and the replica are two SQLite files with different rows,
+    the rows returned tell which one a request read from
+    """
+
+    def setUp(self):
+        super(ReplicaTest, self).setUp()
+        self.replica_dir = tempfile.mkdtemp()
+        self.set_replica('sqlite:///' +
+                         os.path.join(self.replica_dir, 'replica.db'))
+        with self.app_context():
+            replica = db.get_engine(flaskApp, bind='replica_0')
+            db.Model.metadata.create_all(bind=replica)
+            replica.execute(StoreModel.__table__.insert(), name='store1')
+            replica.execute(
+                ItemModel.__table__.insert(),
+                name='replica-item', price=1.0, store_id=1)
+
+            with self.client() as client:
+                # Users only exist in the primary
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                StoreModel('store1').save_to_db()
+                ItemModel('primary-item', 2.0, 1).save_to_db()
+                auth_resp = client.post(
+                    ReplicaTest.BASE_API_URL + '/auth',
+                    data=json.dumps({
+                        'username': 'alexmtnezf',
+                        'password': '1234'
+                    }),
+                    headers={'Content-Type': 'application/json'})
+                jwt_token = json.loads(
+                    auth_resp.data.decode('utf-8'))['access_token']
+                self.headers = {'Authorization': 'Bearer {}'.format(jwt_token)}
+
+    def tearDown(self):
+        with self.app_context():
+            db.get_engine(flaskApp, bind='replica_0').dispose()
+        self.set_replica(None)
+        shutil.rmtree(self.replica_dir)
+        super(ReplicaTest, self).tearDown()
+
+    @staticmethod
+    def set_replica(url, lag_query=None):
+        flaskApp.config['SQLALCHEMY_BINDS'] = {'replica_0': url} if url else {}
+        flaskApp.config['SQLALCHEMY_REPLICA_BINDS'] = ['replica_0'] if url else []
+        flaskApp.config['SQLALCHEMY_REPLICA_LAG_QUERY'] = lag_query
+        flaskApp.extensions.pop('db_replicas', None)
+
+    @staticmethod
+    def check_replicas():
+        # Lags are measured in the background, until then requests read from
+        # the primary
+        with flaskApp.app_context():
+            replicas.choose_replica()
+            flaskApp.extensions['db_replicas'].wait()
+
+    def get_item_names(self, client):
+        resp = client.get(
+            ReplicaTest.BASE_API_URL + '/items', headers=self.headers)
+        self.assertEqual(200, resp.status_code)
+        return [
+            item['name']
+            for item in json.loads(resp.data.decode('utf-8'))['items']
+        ]
+
+    def test_get_reads_from_replica(self):
+        with self.app_context():
+            with self.client() as cl:
+                self.assertEqual(['primary-item'], self.get_item_names(cl))
+                self.check_replicas()
+                self.assertEqual(['replica-item'], self.get_item_names(cl))
+                resp = cl.get(
+                    ReplicaTest.BASE_API_URL + '/item/replica-item',
+                    headers=self.headers)
+                self.assertEqual(200, resp.status_code)
+                resp = cl.get(
+                    ReplicaTest.BASE_API_URL + '/export/items',
+                    headers=self.headers)
+                self.assertIn('replica-item', resp.data.decode('utf-8'))
+
+    @mock.patch('utils.notifications.NotificationDispatcher.send_sms')
+    def test_writes_use_primary(self, send_sms):
+        self.check_replicas()
+        with self.app_context():
+            with self.client() as cl:
+                resp = cl.post(
+                    ReplicaTest.BASE_API_URL + '/item/new-item',
+                    data=json.dumps({
+                        'price': 3.0,
+                        'store_id': 1
+                    }),
+                    headers=dict(self.headers,
+                                 **{'Content-Type': 'application/json'}))
+                self.assertEqual(201, resp.status_code)
+                self.assertIsNotNone(ItemModel.find_by_name('new-item'))
+                # Not replicated
+                self.assertEqual(['replica-item'], self.get_item_names(cl))
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.set_replica(flaskApp.config['SQLALCHEMY_BINDS']['replica_0'],
+                         lag_query='SELECT 60')
+        self.check_replicas()
+        with self.app_context():
+            with self.client() as cl:
+                self.assertEqual(['primary-item'], self.get_item_names(cl))
+                resp = cl.get(
+                    ReplicaTest.BASE_API_URL + '/stats/cache',
+                    headers=self.headers)
+                replicas = json.loads(resp.data.decode('utf-8'))['replicas']
+                self.assertEqual({
+                    'replica_0': {
+                        'lag': 60.0,
+                        'error': None
+                    }
+                }, replicas)
+
+    def test_checks_run_one_at_a_time(self):
+        checked = threading.Event()
+        release = threading.Event()
+
+        def measure(engine):
+            checked.set()
+            release.wait(5)
+            return 0.0
+
+        flaskApp.config['SQLALCHEMY_REPLICA_CHECK_INTERVAL'] = 0
+        try:
+            with self.app_context():
+                replica_set = replicas._replica_set()
+                with mock.patch.object(replica_set, '_measure',
+                                       side_effect=measure) as measured:
+                    with self.client() as cl:
+                        # The replica hangs: requests keep reading from the
+                        # primary meanwhile, without waiting for it
+                        for _ in range(3):
+                            self.assertEqual(['primary-item'],
+                                             self.get_item_names(cl))
+                        self.assertTrue(checked.wait(5))
+                        self.assertEqual(1, measured.call_count)
+                    release.set()
+                    replica_set.wait()
+        finally:
+            release.set()
+            flaskApp.config['SQLALCHEMY_REPLICA_CHECK_INTERVAL'] = 5.0
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        self.set_replica('sqlite:///' + os.path.join(
+            self.replica_dir, 'missing', 'replica.db'))
+        self.check_replicas()
+        with self.app_context():
+            with self.client() as cl:
+                self.assertEqual(['primary-item'], self.get_item_names(cl))
@@ -174,3 +174,64 @@ class StoreTest(BaseTest):
                         }]
                     }]
                 }, json.loads(resp.data.decode('utf-8')))
+
+    def test_store_list_queries(self):
+        with self.app_context():
+            with self.client() as cl:
+                for number in range(5):
+                    store = StoreModel('store{}'.format(number)).save_to_db()
+                    ItemModel('item{}'.format(number), 9.99,
+                              store.id).save_to_db()
+
+                # Only the names of the stores for anonymous users
+                with self.assertMaxQueries(
+                        1, tables=('stores', 'items')) as statements:
+                    resp = cl.get(StoreTest.BASE_API_URL + '/stores')
+                self.assertEqual(200, resp.status_code)
+                self.assertEqual(1, len(statements))
+                self.assertNotIn('FROM items', statements[0])
+                # Stores, then the items of all of them: not one per store
+                with self.assertMaxQueries(
+                        2, tables=('stores', 'items')) as statements:
+                    resp = cl.get(
+                        StoreTest.BASE_API_URL + '/stores',
+                        headers=self.headers)
+                self.assertEqual(200, resp.status_code)
+                self.assertEqual(2, len(statements))
+
+    def test_store_list_pages(self):
+        with self.app_context():
+            with self.client() as cl:
+                for number in range(3):
+                    StoreModel('store{}'.format(number)).save_to_db()
+
+                resp = cl.get(StoreTest.BASE_API_URL + '/stores?limit=2')
+                self.assertEqual(['store0', 'store1'],
+                                 json.loads(resp.data.decode('utf-8'))['stores'])
+                self.assertEqual('2', resp.headers['X-Next-Cursor'])
+
+                resp = cl.get(StoreTest.BASE_API_URL + '/stores?limit=2&after=2')
+                self.assertEqual(['store2'],
+                                 json.loads(resp.data.decode('utf-8'))['stores'])
+                self.assertNotIn('X-Next-Cursor', resp.headers)
+
+    def test_store_list_streamed(self):
+        with self.app_context():
+            with self.client() as cl:
+                for number in range(3):
+                    store = StoreModel('store{}'.format(number)).save_to_db()
+                    ItemModel('item{}'.format(number), 9.99,
+                              store.id).save_to_db()
+
+                resp = cl.get(
+                    StoreTest.BASE_API_URL + '/stores?paginate=false',
+                    headers=self.headers)
+                self.assertEqual(200, resp.status_code)
+                self.assertTrue(resp.is_streamed)
+                stores = json.loads(resp.data.decode('utf-8'))['stores']
+                self.assertEqual(3, len(stores))
+                self.assertEqual([{
+                    'name': 'item2',
+                    'price': 9.99,
+                    'store_id': 3
+                }], stores[2]['items'])
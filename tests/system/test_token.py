@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import json
+
+from flask_jwt_extended import decode_token
+
+from app import flaskApp
+from models.user import UserModel
+from tests.base_test import BaseTest
+from utils import jwt_cache
+from utils.blacklist_helpers import revoke_token
+
+
+class TokenTest(BaseTest):
+    def _login(self, client):
+        auth_response = client.post(
+            TokenTest.BASE_API_URL + '/auth',
+            data=json.dumps({
+                'username': 'alexmtnezf',
+                'password': '1234'
+            }),
+            headers={'Content-Type': 'application/json'})
+        return json.loads(auth_response.data.decode('utf-8'))
+
+    def test_token_list_pages(self):
+        with self.app_context():
+            with self.client() as c:
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                for _ in range(2):
+                    self._login(c)
+                headers = {
+                    'Authorization':
+                        'Bearer {}'.format(self._login(c)['access_token'])
+                }
+
+                token_ids = []
+                url = TokenTest.BASE_API_URL + '/token?limit=4'
+                while url:
+                    response = c.get(url, headers=headers)
+                    self.assertEqual(200, response.status_code)
+                    page = json.loads(response.data.decode('utf-8'))
+                    self.assertLessEqual(len(page), 4)
+                    token_ids.extend(token['token_id'] for token in page)
+                    url = response.headers.get('Link', '')[1:].split('>')[0]
+                    if url:
+                        self.assertTrue(url.endswith(
+                            'after={}'.format(token_ids[-1])))
+
+                self.assertEqual(list(range(1, 7)), token_ids)
+
+    def test_token_list_filters(self):
+        with self.app_context():
+            with self.client() as c:
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                revoked_token = decode_token(self._login(c)['refresh_token'])
+                revoke_token(revoked_token['jti'], 'alexmtnezf')
+                headers = {
+                    'Authorization':
+                        'Bearer {}'.format(self._login(c)['access_token'])
+                }
+
+                response = c.get(
+                    TokenTest.BASE_API_URL + '/token?revoked=true',
+                    headers=headers)
+                page = json.loads(response.data.decode('utf-8'))
+                self.assertEqual([revoked_token['jti']],
+                                 [token['jti'] for token in page])
+                self.assertNotIn('X-Next-Cursor', response.headers)
+
+                response = c.get(
+                    TokenTest.BASE_API_URL +
+                    '/token?revoked=false&token_type=access',
+                    headers=headers)
+                page = json.loads(response.data.decode('utf-8'))
+                self.assertEqual(2, len(page))
+                self.assertEqual({'access'},
+                                 set(token['token_type'] for token in page))
+
+                response = c.get(
+                    TokenTest.BASE_API_URL + '/token?limit=0', headers=headers)
+                self.assertEqual(400, response.status_code)
+
+    def test_decode_cache_keeps_revocation(self):
+        with self.app_context():
+            with self.client() as c:
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                headers = {
+                    'Authorization':
+                        'Bearer {}'.format(self._login(c)['access_token'])
+                }
+
+                flaskApp.config['JWT_DECODE_CACHE'] = True
+                jwt_cache.install()
+                try:
+                    for _ in range(2):
+                        response = c.get(
+                            TokenTest.BASE_API_URL + '/protected',
+                            headers=headers)
+                        self.assertEqual(200, response.status_code)
+                    stats = flaskApp.extensions['jwt_decode_cache'].stats()
+                    self.assertEqual(1, stats['hits'])
+
+                    response = c.delete(
+                        TokenTest.BASE_API_URL + '/logout/access',
+                        headers=headers)
+                    self.assertEqual(200, response.status_code)
+                    response = c.get(
+                        TokenTest.BASE_API_URL + '/protected', headers=headers)
+                    self.assertEqual(401, response.status_code)
+                finally:
+                    jwt_cache.uninstall()
+                    flaskApp.config['JWT_DECODE_CACHE'] = False
+                    flaskApp.extensions.pop('jwt_decode_cache', None)
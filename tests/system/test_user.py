@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 import json
 
+from app import flaskApp
+from db import db
 from models.user import UserModel
 from tests.base_test import BaseTest
+from utils import hashing
 
 
 class UserTest(BaseTest):
@@ -92,3 +95,127 @@ class UserTest(BaseTest):
                 self.assertDictEqual({
                     'message': 'Wrong credentials'
                 }, json.loads(response.data.decode('utf-8')))
+
+    def _login(self, client, username, password):
+        auth_response = client.post(
+            UserTest.BASE_API_URL + '/auth',
+            data=json.dumps({
+                'username': username,
+                'password': password
+            }),
+            headers={'Content-Type': 'application/json'})
+        access_token = json.loads(
+            auth_response.data.decode('utf-8'))['access_token']
+        return {'Authorization': 'Bearer {}'.format(access_token)}
+
+    def test_deleted_user_is_not_cached(self):
+        with self.app_context():
+            with self.client() as c:
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                UserModel('Bob', 'bob', '1234', is_admin=False).save_to_db()
+                admin_headers = self._login(c, 'alexmtnezf', '1234')
+                user_headers = self._login(c, 'bob', '1234')
+
+                # Bob is loaded, and cached, by a protected endpoint
+                response = c.get(
+                    UserTest.BASE_API_URL + '/protected', headers=user_headers)
+                self.assertEqual(200, response.status_code)
+
+                response = c.delete(
+                    UserTest.BASE_API_URL + '/user/bob', headers=admin_headers)
+                self.assertEqual(200, response.status_code)
+
+                response = c.get(
+                    UserTest.BASE_API_URL + '/protected', headers=user_headers)
+                self.assertEqual(404, response.status_code)
+
+    def test_cache_stats(self):
+        with self.app_context():
+            with self.client() as c:
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                headers = self._login(c, 'alexmtnezf', '1234')
+
+                response = c.get(
+                    UserTest.BASE_API_URL + '/stats/cache', headers=headers)
+                self.assertEqual(200, response.status_code)
+                stats = json.loads(response.data.decode('utf-8'))
+                self.assertEqual({'size', 'maxsize', 'hits', 'misses'},
+                                 set(stats['users'].keys()))
+                self.assertGreaterEqual(stats['users']['size'], 1)
+
+    def test_pool_stats(self):
+        with self.app_context():
+            with self.client() as c:
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                UserModel('Bob', 'bob', '1234', is_admin=False).save_to_db()
+                admin_headers = self._login(c, 'alexmtnezf', '1234')
+                user_headers = self._login(c, 'bob', '1234')
+
+                response = c.get(
+                    UserTest.BASE_API_URL + '/stats/pool',
+                    headers=user_headers)
+                self.assertEqual(403, response.status_code)
+                response = c.get(
+                    UserTest.BASE_API_URL + '/stats/pool',
+                    headers=admin_headers)
+                self.assertEqual(200, response.status_code)
+                stats = json.loads(response.data.decode('utf-8'))
+                self.assertIn('pid', stats)
+                # SQLite does not pool connections
+                self.assertEqual({'class': 'NullPool'},
+                                 stats['pools']['default'])
+
+    def test_claims_only_principal(self):
+        with self.app_context():
+            with self.client() as c:
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                headers = self._login(c, 'alexmtnezf', '1234')
+                # The users table is not read any more
+                UserModel.query.delete()
+                db.session.commit()
+
+                flaskApp.config['JWT_CLAIMS_ONLY_PRINCIPAL'] = True
+                try:
+                    response = c.get(
+                        UserTest.BASE_API_URL + '/protected', headers=headers)
+                finally:
+                    flaskApp.config['JWT_CLAIMS_ONLY_PRINCIPAL'] = False
+                self.assertEqual(200, response.status_code)
+
+    def test_login_upgrades_password_hash(self):
+        with self.app_context():
+            with self.client() as c:
+                hashing.configure(0, rounds=1000)
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                hashing.configure(
+                    flaskApp.config['PASSWORD_HASH_POOL_SIZE'],
+                    flaskApp.config['PASSWORD_HASH_ROUNDS'])
+
+                self._login(c, 'alexmtnezf', '1234')
+                user = UserModel.find_by_username('alexmtnezf')
+                self.assertFalse(hashing.needs_rehash(user.password))
+                self.assertTrue(user.verify_password('1234'))
+
+    def test_logout_everywhere(self):
+        with self.app_context():
+            with self.client() as c:
+                UserModel(
+                    'Alex', 'alexmtnezf', '1234', is_admin=True).save_to_db()
+                headers = self._login(c, 'alexmtnezf', '1234')
+                other_headers = self._login(c, 'alexmtnezf', '1234')
+
+                response = c.delete(
+                    UserTest.BASE_API_URL + '/logout/all', headers=headers)
+                self.assertEqual(200, response.status_code)
+                # Both access and refresh tokens of both logins
+                self.assertEqual(
+                    4, json.loads(response.data.decode('utf-8'))['revoked'])
+
+                response = c.get(
+                    UserTest.BASE_API_URL + '/protected', headers=other_headers)
+                self.assertEqual(401, response.status_code)
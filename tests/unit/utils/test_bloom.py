@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+BloomFilterTest
+
+Only test methods that don't depend on databases or other classes of your app
+"""
+import uuid
+
+from tests.unit.unit_base_test import UnitBaseTest
+from utils.bloom import BloomFilter
+
+
+class BloomFilterTest(UnitBaseTest):
+    def test_added_keys_are_found(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [str(uuid.uuid4()) for _ in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertEqual(1000, len(bloom))
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom.add(str(uuid.uuid4()))
+        false_positives = sum(
+            str(uuid.uuid4()) in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+TTLCacheTest
+
+Only test methods that don't depend on databases or other classes of your app
+"""
+
+from tests.unit.unit_base_test import UnitBaseTest
+from utils.cache import TTLCache
+
+
+class TTLCacheTest(UnitBaseTest):
+    def setUp(self):
+        self.now = 1000
+        self.cache = TTLCache(maxsize=2, timer=lambda: self.now)
+
+    def test_entries_expire(self):
+        self.cache.set('jti', False, self.now + 10)
+        self.assertFalse(self.cache.get('jti'))
+        self.now += 10
+        self.assertIsNone(self.cache.get('jti'))
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set('a', 1, self.now + 10)
+        self.cache.set('b', 2, self.now + 10)
+        self.cache.get('a')
+        self.cache.set('c', 3, self.now + 10)
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertIn('c', self.cache)
+
+    def test_disabled_cache(self):
+        cache = TTLCache(maxsize=0)
+        cache.set('a', 1, self.now + 10)
+        self.assertEqual(0, len(cache))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+DbPoolTest
+
+Only test methods that don't depend on databases or other classes of your app
+"""
+import sqlite3
+
+from sqlalchemy import exc
+
+from tests.unit.unit_base_test import UnitBaseTest
+from utils.db_pool import InstrumentedQueuePool, pool_options, pool_stats
+
+
+class DbPoolTest(UnitBaseTest):
+    def setUp(self):
+        self.pool = InstrumentedQueuePool(
+            lambda: sqlite3.connect(':memory:'),
+            pool_size=1,
+            max_overflow=0,
+            timeout=0.05)
+
+    def tearDown(self):
+        self.pool.dispose()
+
+    def test_checkout_counters(self):
+        connection = self.pool.connect()
+        stats = pool_stats(self.pool)
+        self.assertEqual(1, stats['checked_out'])
+        self.assertEqual(0, stats['overflow'])
+        self.assertEqual(1, stats['checkouts'])
+        self.assertEqual(1, stats['wait_ms_histogram']['1'])
+
+        # The only connection is checked out
+        with self.assertRaises(exc.TimeoutError):
+            self.pool.connect()
+        connection.close()
+        stats = pool_stats(self.pool)
+        self.assertEqual(0, stats['checked_out'])
+        self.assertEqual(1, stats['checkout_timeouts'])
+        self.assertEqual(1, stats['wait_ms_histogram']['50'] +
+                         stats['wait_ms_histogram']['100'])
+        self.assertGreaterEqual(stats['wait_ms_max'], 50)
+
+    def test_recreate_keeps_counters(self):
+        self.pool.connect().close()
+        pool = self.pool.recreate()
+        self.assertEqual(1, pool_stats(pool)['checkouts'])
+        pool.dispose()
+
+    def test_pool_options(self):
+        options = pool_options({
+            'DATABASE_POOL_SIZE': 50,
+            'DATABASE_MAX_OVERFLOW': 5,
+            'DATABASE_POOL_PRE_PING': True
+        })
+        self.assertIs(InstrumentedQueuePool, options['poolclass'])
+        self.assertEqual(50, options['pool_size'])
+        self.assertEqual(5, options['max_overflow'])
+        self.assertEqual(30, options['pool_timeout'])
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertNotIn('pool_size', pool_options({}))
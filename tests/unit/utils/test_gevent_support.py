@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+GeventSupportTest
+
+Only test methods that don't depend on databases or other classes of your app
+"""
+import socket
+import time
+
+import gevent
+from psycopg2 import extensions
+
+from tests.unit.unit_base_test import UnitBaseTest
+from utils import gevent_support
+
+
+class FakeConnection(object):
+    """
+    Connection of psycopg2 whose server answers after delay seconds
+    """
+
+    def __init__(self, delay):
+        self.client, self.server = socket.socketpair()
+        gevent.spawn_later(delay, self.server.send, b'x')
+
+    def fileno(self):
+        return self.client.fileno()
+
+    def poll(self):
+        self.client.setblocking(False)
+        try:
+            self.client.recv(1)
+        except BlockingIOError:
+            return extensions.POLL_READ
+        return extensions.POLL_OK
+
+    def close(self):
+        self.client.close()
+        self.server.close()
+
+
+class GeventSupportTest(UnitBaseTest):
+    def test_wait_callback_overlaps_waits(self):
+        connections = [FakeConnection(0.2) for _ in range(5)]
+        start = time.time()
+        gevent.joinall([
+            gevent.spawn(gevent_support.gevent_wait_callback, connection)
+            for connection in connections
+        ], raise_error=True)
+        # One wait at a time would take 1 s
+        self.assertLess(time.time() - start, 0.5)
+        for connection in connections:
+            connection.close()
+
+    def test_install_needs_gevent_patched(self):
+        if gevent_support.gevent_patched():
+            self.skipTest('The test process is patched by gevent')
+        self.assertFalse(gevent_support.install())
+        self.assertIsNone(extensions.get_wait_callback())
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+HashingTest
+
+Only test methods that don't depend on databases or other classes of your app
+"""
+from tests.unit.unit_base_test import UnitBaseTest
+from utils import hashing
+
+
+class HashingTest(UnitBaseTest):
+    def tearDown(self):
+        hashing.configure(0)
+
+    def test_hash_inline(self):
+        hashing.configure(0)
+        password_hash = hashing.hash_password('1234')
+        self.assertTrue(hashing.verify_password('1234', password_hash))
+        self.assertFalse(hashing.verify_password('4321', password_hash))
+
+    def test_hash_on_pool(self):
+        hashing.configure(2)
+        password_hash = hashing.hash_password('1234')
+        self.assertTrue(hashing.verify_password('1234', password_hash))
+        self.assertIsNotNone(hashing._pool)
+
+    def test_needs_rehash(self):
+        hashing.configure(0, rounds=1000)
+        password_hash = hashing.hash_password('1234')
+        self.assertFalse(hashing.needs_rehash(password_hash))
+        hashing.configure(0, rounds=2000)
+        self.assertTrue(hashing.needs_rehash(password_hash))
+
+    def test_calibrate(self):
+        rounds, ms_per_1000 = hashing.calibrate(target_ms=10, samples=1)
+        self.assertGreater(ms_per_1000, 0)
+        self.assertGreaterEqual(rounds, 1000)
+        self.assertEqual(0, rounds % 1000)
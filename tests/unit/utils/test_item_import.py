@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+ItemImportTest
+
+Only test methods that don't depend on databases or other classes of your app
+"""
+import io
+import json
+
+from tests.unit.unit_base_test import UnitBaseTest
+from utils.item_import import (ImportFormatError, _iter_json_array,
+                               validate_item)
+
+
+class ItemImportTest(UnitBaseTest):
+    def test_iter_json_array_across_chunks(self):
+        items = [{'name': 'item{}'.format(n), 'price': n * 1000}
+                 for n in range(20)]
+        reader = io.StringIO(' ' + json.dumps(items, indent=1) + '\n')
+        self.assertEqual(items, list(_iter_json_array(reader, chunk_size=7)))
+        self.assertEqual([], list(_iter_json_array(io.StringIO('[ ]'))))
+
+    def test_iter_json_array_invalid(self):
+        for body in ('', '{}', '[1, 2', '[1 2]', '[1, nope]'):
+            with self.assertRaises(ImportFormatError):
+                list(_iter_json_array(io.StringIO(body), chunk_size=2))
+
+    def test_validate_item(self):
+        self.assertEqual({'name': 'item', 'price': 9.99, 'store_id': 1},
+                         validate_item({'name': 'item', 'price': '9.99',
+                                        'store_id': '1'}))
+        invalid = [
+            {'name': 'item', 'price': 1},
+            {'name': 'item', 'price': 1, 'store_id': 1, 'id': 3},
+            {'name': 'item', 'price': True, 'store_id': 1},
+            {'name': 'item', 'price': 1, 'store_id': 1.5},
+            {'name': 'x' * 81, 'price': 1, 'store_id': 1},
+            ['item', 1, 1],
+        ]
+        for record in invalid:
+            with self.assertRaises(ValueError):
+                validate_item(record)
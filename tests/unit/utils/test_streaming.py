@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+StreamingTest
+
+Only test methods that don't depend on databases or other classes of your app
+"""
+import json
+
+from tests.unit.unit_base_test import UnitBaseTest
+from utils.streaming import JSONArray, iter_json
+
+
+class StreamingTest(UnitBaseTest):
+    def test_iter_json(self):
+        value = {
+            'items': JSONArray(range(5), lambda number: {'n': number}),
+            'message': 'done'
+        }
+        chunks = list(iter_json(value, chunk_size=2))
+        self.assertGreater(len(chunks), 5)
+        self.assertEqual({
+            'items': [{'n': number} for number in range(5)],
+            'message': 'done'
+        }, json.loads(''.join(chunks)))
+
+    def test_iter_json_empty(self):
+        self.assertEqual({}, json.loads(''.join(iter_json({}))))
+        self.assertEqual({'items': []},
+                         json.loads(''.join(iter_json(
+                             {'items': JSONArray([])}))))
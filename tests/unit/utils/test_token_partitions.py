@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+TokenPartitionsTest
+
+Only test methods that don't depend on databases or other classes of your app
+"""
+from datetime import date
+
+from tests.unit.unit_base_test import UnitBaseTest
+from models.token import TokenModel
+from utils.token_partitions import _index_ddl, partition_day, partition_name
+
+
+class TokenPartitionsTest(UnitBaseTest):
+    def test_partition_name(self):
+        self.assertEqual('revoked_tokens_p20181231',
+                         partition_name(date(2018, 12, 31)))
+
+    def test_partition_day(self):
+        self.assertEqual(
+            date(2018, 12, 31), partition_day('revoked_tokens_p20181231'))
+        self.assertIsNone(partition_day('revoked_tokens_default'))
+
+    def test_unique_index_includes_partition_key(self):
+        indexes = {
+            index.name: _index_ddl(index)
+            for index in TokenModel.__table__.indexes
+        }
+        self.assertEqual(
+            'CREATE UNIQUE INDEX ix_revoked_tokens_jti ON revoked_tokens '
+            '(jti, expires)', indexes['ix_revoked_tokens_jti'])
+        self.assertEqual(
+            'CREATE INDEX ix_revoked_tokens_expires ON revoked_tokens '
+            '(expires)', indexes['ix_revoked_tokens_expires'])
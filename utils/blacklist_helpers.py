@@ -1,12 +1,21 @@
 # -*- coding: utf-8 -*-
-from datetime import datetime
+import base64
+import calendar
+import json
+import time
+from datetime import datetime, timedelta
 
-from flask_jwt_extended import decode_token
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
 from db import db
-from exception import TokenNotFound
-from models.token import TokenModel
+from exception import TokenNotFound, TokenWriteError
+from models.token import TokenCutoffModel, TokenModel, TokenEventModel
+from utils.bloom import BloomFilter
+from utils import token_partitions
+from utils.cache import TTLCache
+from utils.token_writer import TokenWriter
 
 
 def _epoch_utc_to_datetime(epoch_utc):
@@ -17,27 +26,334 @@ def _epoch_utc_to_datetime(epoch_utc):
     return datetime.utcfromtimestamp(epoch_utc)
 
 
+def _datetime_to_epoch_utc(date):
+    """
+    Inverse of _epoch_utc_to_datetime, for the naive UTC datetimes stored in
+    the expires column.
+    """
+    return calendar.timegm(date.utctimetuple())
+
+
+def _revocation_cache():
+    """
+    Returns the per-process cache of jti -> revoked state for the current app.
+    Entries expire with their token, so the cache never outlives a JWT.
+    """
+    cache = current_app.extensions.get('revoked_tokens_cache')
+    if cache is None:
+        cache = TTLCache(
+            maxsize=current_app.config.get('JWT_REVOCATION_CACHE_SIZE', 10000))
+        current_app.extensions['revocation_feed'] = {
+            'since': datetime.utcnow() - _revocation_poll_grace(),
+            'next_poll': 0
+        }
+        current_app.extensions['revoked_tokens_cache'] = cache
+    return cache
+
+
+def revocation_cache_stats():
+    return _revocation_cache().stats()
+
+
+def _revocation_poll_grace():
+    return timedelta(
+        seconds=current_app.config.get('JWT_REVOCATION_POLL_GRACE', 5))
+
+
+def _revoked_only():
+    """
+    True when the app stores only revoked tokens (JWT_TOKEN_STORAGE='revoked')
+    instead of every issued token (JWT_TOKEN_STORAGE='all', the default)
+    """
+    return current_app.config.get('JWT_TOKEN_STORAGE', 'all') == 'revoked'
+
+
+def _revoked_jtis_filter():
+    """
+    Returns the Bloom filter of the revoked, not yet expired, jtis. It is
+    rebuilt from the table every JWT_BLOOM_REBUILD_INTERVAL seconds, which
+    sheds expired jtis and resizes it to the current number of revocations.
+    """
+    state = current_app.extensions.get('revoked_jtis_filter')
+    now = time.time()
+    if state is None or now >= state['rebuild_at']:
+        jtis = db.session.query(TokenModel.jti).filter(
+            TokenModel.revoked.is_(True),
+            TokenModel.expires > datetime.utcnow())
+        bloom = BloomFilter(
+            capacity=max(
+                current_app.config.get('JWT_BLOOM_CAPACITY', 100000),
+                2 * jtis.count()),
+            error_rate=current_app.config.get('JWT_BLOOM_ERROR_RATE', 0.001))
+        for jti, in jtis.yield_per(1000):
+            bloom.add(jti)
+        state = {
+            'filter':
+                bloom,
+            'rebuild_at':
+                now + current_app.config.get('JWT_BLOOM_REBUILD_INTERVAL', 3600)
+        }
+        current_app.extensions['revoked_jtis_filter'] = state
+    return state['filter']
+
+
+def _token_writer():
+    """
+    Returns the write-behind writer of the current app, or None if tokens
+    are written synchronously (JWT_TOKEN_WRITE_BEHIND disabled)
+    """
+    if not current_app.config.get('JWT_TOKEN_WRITE_BEHIND', False):
+        return None
+    writer = current_app.extensions.get('token_writer')
+    if writer is None:
+        config = current_app.config
+        writer = TokenWriter(
+            current_app._get_current_object(),
+            batch_size=config.get('JWT_TOKEN_WRITE_BATCH_SIZE', 500),
+            flush_interval=config.get('JWT_TOKEN_WRITE_INTERVAL_MS', 50) /
+            1000.0,
+            queue_size=config.get('JWT_TOKEN_WRITE_QUEUE_SIZE', 10000),
+            put_timeout=config.get('JWT_TOKEN_WRITE_TIMEOUT', 1.0))
+        current_app.extensions['token_writer'] = writer
+    return writer
+
+
+def _maybe_queued(decoded_token):
+    """
+    Tells if a token missing from the table may still be queued by the
+    write-behind writer of another worker: write-behind is enabled and the
+    token was issued less than JWT_TOKEN_WRITE_GRACE seconds ago
+    """
+    if not current_app.config.get('JWT_TOKEN_WRITE_BEHIND', False):
+        return False
+    grace = current_app.config.get('JWT_TOKEN_WRITE_GRACE', 5.0)
+    return time.time() - decoded_token.get('iat', 0) <= grace
+
+
+def _token_cutoffs():
+    """
+    Returns the per-process dict of user_identity -> epoch up to which the
+    tokens of the user are revoked (see TokenCutoffModel). It is loaded from
+    the table once, then sync_revocations keeps it up to date.
+    """
+    cutoffs = current_app.extensions.get('token_cutoffs')
+    if cutoffs is None:
+        cutoffs = {}
+        _apply_cutoffs(cutoffs, db.session.query(
+            TokenCutoffModel.user_identity,
+            TokenCutoffModel.revoked_before).filter(
+                TokenCutoffModel.expires > datetime.utcnow()))
+        current_app.extensions['token_cutoffs'] = cutoffs
+    return cutoffs
+
+
+def _apply_cutoffs(cutoffs, rows):
+    for user_identity, revoked_before in rows:
+        epoch = _datetime_to_epoch_utc(revoked_before)
+        if epoch > cutoffs.get(user_identity, 0):
+            cutoffs[user_identity] = epoch
+
+
+def _revoked_by_cutoff(decoded_token):
+    """
+    Tells if a token was issued before a logout everywhere of its user, or
+    in the same second, while tokens are written behind
+    """
+    if not current_app.config.get('JWT_TOKEN_WRITE_BEHIND', False):
+        return False
+    cutoff = _token_cutoffs().get(
+        decoded_token.get(current_app.config['JWT_IDENTITY_CLAIM']))
+    return cutoff is not None and decoded_token.get('iat', 0) <= cutoff
+
+
+def _token_lifetime():
+    """
+    Lifetime of the longest lived tokens, None if some never expire
+    """
+    lifetimes = [
+        current_app.config.get(name)
+        for name in ('JWT_ACCESS_TOKEN_EXPIRES', 'JWT_REFRESH_TOKEN_EXPIRES')
+    ]
+    if not all(isinstance(lifetime, timedelta) for lifetime in lifetimes):
+        return None
+    return max(lifetimes)
+
+
+def token_writer_stats():
+    """
+    Returns the queue and failure counters of the write-behind writer of
+    this process, or None when tokens are written synchronously
+    """
+    writer = _token_writer()
+    return writer.stats() if writer is not None else None
+
+
+def flush_token_writer():
+    """
+    Waits until the tokens queued by this process are in the database
+    """
+    writer = _token_writer()
+    if writer is not None:
+        writer.flush()
+
+
+def _flush_tokens(match):
+    """
+    Waits until the tokens queued by this process for which match(row) is
+    true are in the database. Returns the rows of those that failed to be
+    written, the failure is logged instead of failing the request.
+    """
+    writer = _token_writer()
+    if writer is None:
+        return []
+    try:
+        writer.flush(match)
+    except TokenWriteError as ex:
+        current_app.logger.warning('\nToken writer error: {0} \n'.format(ex))
+        return writer.pending_rows(match)
+    return []
+
+
+def _publish_revocation(token):
+    """
+    Records a change of the revoked state of token in the token_events feed,
+    so the other workers can update their caches. It is added to the current
+    session, hence committed in the same transaction as the change itself.
+    """
+    db.session.add(TokenEventModel(
+        jti=token.jti, revoked=token.revoked, expires=token.expires))
+
+
+def _publish_revocations(tokens, revoked):
+    """
+    Bulk version of _publish_revocation for (jti, expires) pairs, in one
+    executemany statement of the current session
+    """
+    if tokens:
+        db.session.execute(TokenEventModel.__table__.insert(), [{
+            'jti': jti,
+            'revoked': revoked,
+            'expires': expires,
+            'created': datetime.utcnow()
+        } for jti, expires in tokens])
+
+
+def _cache_revocations(tokens, revoked):
+    cache = _revocation_cache()
+    for jti, expires in tokens:
+        cache.set(jti, revoked, _datetime_to_epoch_utc(expires))
+
+
+def _active_tokens(user_identity):
+    """
+    Query of the tokens of the given user that are neither revoked nor
+    expired
+    """
+    return TokenModel.query.filter(
+        TokenModel.user_identity == user_identity,
+        TokenModel.revoked.is_(False),
+        TokenModel.expires > datetime.utcnow())
+
+
+def sync_revocations():
+    """
+    Applies to the cache of this process the revocations committed by any
+    worker since the last poll of the token_events feed.
+    The feed is polled at most once every JWT_REVOCATION_POLL_INTERVAL
+    seconds, which bounds how long another worker's revocation can go
+    unnoticed here. Every poll re-reads the last JWT_REVOCATION_POLL_GRACE
+    seconds of events, so transactions that commit out of order are not lost.
+    """
+    cache = _revocation_cache()
+    feed = current_app.extensions['revocation_feed']
+    now = time.time()
+    if now < feed['next_poll']:
+        return
+
+    feed['next_poll'] = now + current_app.config.get(
+        'JWT_REVOCATION_POLL_INTERVAL', 1)
+    since = feed['since']
+    feed['since'] = datetime.utcnow() - _revocation_poll_grace()
+
+    events = TokenEventModel.query.filter(
+        TokenEventModel.created >= since).order_by(TokenEventModel.id)
+    revoked_only = _revoked_only()
+    for event in events:
+        if revoked_only and event.revoked:
+            _revoked_jtis_filter().add(event.jti)
+        if event.jti in cache:
+            cache.set(event.jti, event.revoked,
+                      _datetime_to_epoch_utc(event.expires))
+    if current_app.config.get('JWT_TOKEN_WRITE_BEHIND', False):
+        _apply_cutoffs(_token_cutoffs(), db.session.query(
+            TokenCutoffModel.user_identity,
+            TokenCutoffModel.revoked_before).filter(
+                TokenCutoffModel.created >= since))
+
+
+def _unverified_claims(encoded_token):
+    """
+    Returns the claims of a JWT we have just created, without verifying its
+    signature again. Never use it for tokens coming from a request.
+    """
+    if isinstance(encoded_token, bytes):
+        encoded_token = encoded_token.decode('utf-8')
+    payload = encoded_token.split('.')[1]
+    return json.loads(
+        base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+
+
+def add_tokens_to_database(encoded_tokens, identity_claim):
+    """
+    Adds a batch of freshly issued tokens to the database, in one INSERT
+    statement and one commit. They are not revoked when they are added.
+    With JWT_TOKEN_WRITE_BEHIND they are queued and written in batches by a
+    background writer instead, unless its queue is full.
+    Nothing is stored in revoked-only mode, see is_token_revoked.
+    :param encoded_tokens: tokens created by create_access_token or
+    create_refresh_token in this request.
+    :param identity_claim:
+    """
+    if _revoked_only():
+        return
+
+    claims = [_unverified_claims(token) for token in encoded_tokens]
+    rows = [{
+        'jti': claim['jti'],
+        'token_type': claim['type'],
+        'user_identity': claim[identity_claim],
+        'expires': _epoch_utc_to_datetime(claim['exp']),
+        'revoked': False
+    } for claim in claims]
+    writer = _token_writer()
+    if writer is not None:
+        rows = writer.put(rows)
+
+    if rows:
+        try:
+            db.session.execute(TokenModel.__table__.insert().values(rows))
+            db.session.commit()
+        except IntegrityError as ex:
+            db.session.rollback()
+            current_app.logger.error('\nDatabase error: {0} \n'.format(ex))
+            raise
+
+    cache = _revocation_cache()
+    for claim in claims:
+        cache.set(claim['jti'], False, claim['exp'])
+
+    max_tokens = current_app.config.get('JWT_MAX_TOKENS_PER_USER', 0)
+    if max_tokens > 0:
+        for user_identity in set(row['user_identity'] for row in rows):
+            evict_user_tokens(user_identity, max_tokens)
+
+
 def add_token_to_database(encoded_token, identity_claim):
     """
     Adds a new token to the database. It is not revoked when it is added.
     :param identity_claim:
     """
-    decoded_token = decode_token(encoded_token)
-    jti = decoded_token['jti']
-    token_type = decoded_token['type']
-    user_identity = decoded_token[identity_claim]
-    expires = _epoch_utc_to_datetime(decoded_token['exp'])
-    revoked = False
-
-    db_token = TokenModel(
-        jti=jti,
-        token_type=token_type,
-        user_identity=user_identity,
-        expires=expires,
-        revoked=revoked,
-    )
-    # Save the token to database
-    db_token.save_to_db()
+    add_tokens_to_database([encoded_token], identity_claim)
 
 
 def is_token_revoked(decoded_token):
@@ -46,34 +362,184 @@ def is_token_revoked(decoded_token):
     tokens that we create into this database, if the token is not present
     in the database we are going to consider it revoked, as we don't know where
     it was created.
+    Known tokens are cached until they expire, unknown ones are not cached
+    because they may still be committed by another worker.
+
+    In revoked-only mode the table holds revoked tokens only, so an unknown
+    token is a valid one. A Bloom filter of the revoked jtis answers most
+    checks, and the database is queried only when the filter has a hit.
+
+    With write-behind, tokens issued before a logout everywhere of their
+    user are revoked, even when the writer of a worker stores them later.
     """
     jti = decoded_token['jti']
+    cache = _revocation_cache()
+    sync_revocations()
+    if _revoked_only() and jti not in _revoked_jtis_filter():
+        return False
+    if _revoked_by_cutoff(decoded_token):
+        return True
+
+    revoked = cache.get(jti)
+    if revoked is not None:
+        return revoked
+
     try:
         token = TokenModel.find_by(jti=jti).one()
-        return token.revoked
     except NoResultFound:
-        return True
+        # Tokens waiting in the write-behind queue are valid ones, those of
+        # the queues of the other workers too while they are recent
+        writer = _token_writer()
+        if writer is not None and writer.pending(jti) is not None:
+            return False
+        if _maybe_queued(decoded_token):
+            return False
+        return not _revoked_only()
 
+    cache.set(jti, token.revoked, decoded_token['exp'])
+    return token.revoked
 
-def get_user_tokens(user_identity):
+
+def get_user_tokens(user_identity, after=None, limit=None, revoked=None,
+                    token_type=None):
     """
-    Returns all of the tokens, revoked and unrevoked, that are stored for the
-    given user
+    Returns a query of the tokens, revoked and unrevoked, that are stored for
+    the given user, in id order. It is a page of keyset pagination on the
+    (user_identity, id) index: the first limit tokens with an id greater
+    than after, optionally only the revoked (or unrevoked) ones of
+    token_type. Tokens of the user that the write-behind writer failed to
+    write are missing from it.
     """
-    return TokenModel.find_by(user_identity=user_identity).all()
+    _flush_tokens(lambda row: row['user_identity'] == user_identity)
+    query = TokenModel.find_by(user_identity=user_identity)
+    if revoked is not None:
+        query = query.filter(TokenModel.revoked.is_(revoked))
+    if token_type is not None:
+        query = query.filter(TokenModel.token_type == token_type)
+    if after is not None:
+        query = query.filter(TokenModel.id > after)
+    query = query.order_by(TokenModel.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
 
 
-def revoke_token(jti, identity):
+def revoke_token(jti, identity, decoded_token=None):
     """
     Revokes the given token. Raises a TokenNotFound error if the token does
-    not exist in the database
+    not exist in the database. In revoked-only mode the token is not stored
+    yet, nor is a token still queued by the writer of another worker, so its
+    row is created from decoded_token. So is the row of a token that the
+    writer of this worker failed to write, which it skips then.
     """
+    unwritten = _flush_tokens(lambda row: row['jti'] == jti)
     try:
         token = TokenModel.find_by(jti=jti, user_identity=identity).one()
-        token.revoked = True
-        token.save_to_db()
     except NoResultFound:
-        raise TokenNotFound("Could not find the token {}".format(jti))
+        if unwritten and unwritten[0]['user_identity'] == identity:
+            token = TokenModel(**unwritten[0])
+        elif not (decoded_token and
+                  (_revoked_only() or _maybe_queued(decoded_token))):
+            raise TokenNotFound("Could not find the token {}".format(jti))
+        else:
+            token = TokenModel(
+                jti=jti,
+                token_type=decoded_token['type'],
+                user_identity=identity,
+                expires=_epoch_utc_to_datetime(decoded_token['exp']),
+                revoked=True)
+
+    token.revoked = True
+    _publish_revocation(token)
+    token.save_to_db()
+    if _revoked_only():
+        _revoked_jtis_filter().add(jti)
+    _revocation_cache().set(jti, True, _datetime_to_epoch_utc(token.expires))
+
+
+def revoke_user_tokens(user_identity, decoded_token=None):
+    """
+    Revokes every active token of the given user (logout everywhere) with a
+    single UPDATE statement and a single commit. Returns the number of
+    revoked tokens.
+    In revoked-only mode the issued tokens are not stored, so only
+    decoded_token, the token of the request, can be revoked. Tokens that
+    the write-behind writer of this worker failed to write are inserted
+    revoked, the writer skips them then, and a TokenCutoffModel revokes
+    those still queued by the other workers.
+    """
+    if _revoked_only():
+        if decoded_token is None:
+            return 0
+        revoke_token(decoded_token['jti'], user_identity, decoded_token)
+        return 1
+    cutoff = None
+    if _token_writer() is not None:
+        # Tokens still queued by the writers of the other workers are stored
+        # unrevoked later, the cutoff revokes them (see is_token_revoked)
+        now = datetime.utcnow()
+        lifetime = _token_lifetime()
+        cutoff = (user_identity, now)
+        db.session.add(TokenCutoffModel(
+            user_identity, now,
+            now + lifetime if lifetime is not None else datetime.max))
+    unwritten = _flush_tokens(
+        lambda row: row['user_identity'] == user_identity)
+    if unwritten:
+        # Unwritten tokens revoked one by one have their row already
+        existing = {
+            jti for jti, in db.session.query(TokenModel.jti).filter(
+                TokenModel.jti.in_([row['jti'] for row in unwritten]))
+        }
+        unwritten = [row for row in unwritten if row['jti'] not in existing]
+    tokens = _active_tokens(user_identity).with_entities(
+        TokenModel.id, TokenModel.jti,
+        TokenModel.expires).order_by(TokenModel.id.desc()).all()
+
+    # Bounded by the newest selected id: tokens issued meanwhile are kept,
+    # they have no revocation event to invalidate the caches of other workers
+    if tokens:
+        _active_tokens(user_identity).filter(
+            TokenModel.id <= tokens[0].id).update(
+                {'revoked': True}, synchronize_session=False)
+    if unwritten:
+        db.session.execute(TokenModel.__table__.insert().values(
+            [dict(row, revoked=True) for row in unwritten]))
+    revoked = [(token.jti, token.expires) for token in tokens]
+    revoked += [(row['jti'], row['expires']) for row in unwritten]
+    _publish_revocations(revoked, True)
+    db.session.commit()
+    _cache_revocations(revoked, True)
+    if cutoff is not None:
+        _apply_cutoffs(_token_cutoffs(), [cutoff])
+    return len(revoked)
+
+
+def evict_user_tokens(user_identity, max_tokens):
+    """
+    Deletes the oldest active tokens of the given user beyond the newest
+    max_tokens ones, which makes them revoked (see is_token_revoked).
+    Called at issue time when JWT_MAX_TOKENS_PER_USER is set, it keeps the
+    tokens of a user, hence the table, bounded. Tokens still waiting in the
+    write-behind queue are counted at the next issue.
+    Returns the number of evicted tokens.
+    """
+    tokens = _active_tokens(user_identity).with_entities(
+        TokenModel.id, TokenModel.jti,
+        TokenModel.expires).order_by(
+            TokenModel.id.desc()).offset(max_tokens).all()
+    if not tokens:
+        return 0
+
+    TokenModel.query.filter(
+        TokenModel.user_identity == user_identity,
+        TokenModel.revoked.is_(False),
+        TokenModel.id <= tokens[0].id).delete(synchronize_session=False)
+    evicted = [(token.jti, token.expires) for token in tokens]
+    _publish_revocations(evicted, True)
+    db.session.commit()
+    _cache_revocations(evicted, True)
+    return len(tokens)
 
 
 def unrevoke_token(token_id, user):
@@ -84,20 +550,64 @@ def unrevoke_token(token_id, user):
     try:
         token = TokenModel.find_by(id=token_id, user_identity=user).one()
         token.revoked = False
+        _publish_revocation(token)
         token.save_to_db()
     except NoResultFound:
         raise TokenNotFound("Could not find the token {}".format(token_id))
+    _revocation_cache().set(token.jti, False,
+                            _datetime_to_epoch_utc(token.expires))
 
 
-def prune_database():
+def _delete_in_batches(model, condition, batch_size, pause):
+    """
+    Deletes the rows of model matching condition, at most batch_size rows
+    per statement and transaction, sleeping pause seconds between batches.
+    Returns the number of deleted rows.
+    """
+    deleted = 0
+    while True:
+        batch = db.session.query(model.id).filter(condition).limit(batch_size)
+        count = model.query.filter(model.id.in_(batch.subquery())).delete(
+            synchronize_session=False)
+        db.session.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def prune_database(batch_size=1000, pause=0):
     """
     Delete tokens that have expired from the database.
     How (and if) you call this is entirely up you. You could expose it to an
     endpoint that only administrators could call, you could run it as a cron,
     set it up with flask cli, etc.
+    Rows are deleted in chunks of batch_size, each one in its own short
+    transaction driven by the index on expires, sleeping pause seconds
+    between chunks. Returns the number of deleted tokens, the elapsed
+    seconds and the resulting rate in rows per second.
+    When revoked_tokens is partitioned by day (see utils/token_partitions.py)
+    the partitions of past days are dropped first, so only today's rows and
+    the default partition are left to the chunked deletes.
     """
-    now = datetime.now()
-    expired = TokenModel.query.filter(TokenModel.expires < now).all()
-    for token in expired:
-        db.session.delete(token)
-    db.session.commit()
+    start = time.time()
+    now = datetime.utcnow()
+    if token_partitions.is_partitioned():
+        token_partitions.drop_expired_partitions()
+        token_partitions.ensure_partitions(
+            current_app.config.get('TOKEN_PARTITION_DAYS_AHEAD', 32))
+    deleted = _delete_in_batches(TokenModel, TokenModel.expires < now,
+                                 batch_size, pause)
+    # Events are only read during the poll grace period
+    _delete_in_batches(TokenEventModel,
+                       TokenEventModel.created < now - timedelta(days=1),
+                       batch_size, pause)
+    _delete_in_batches(TokenCutoffModel, TokenCutoffModel.expires < now,
+                       batch_size, pause)
+    elapsed = time.time() - start
+    return {
+        'deleted': deleted,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(deleted / elapsed, 1) if elapsed else 0.0
+    }
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+utils/bloom.py
+
+A compact Bloom filter for fast negative membership checks of strings.
+"""
+import hashlib
+import math
+
+
+class BloomFilter(object):
+    """
+    Probabilistic set of strings. A negative answer is always right, a
+    positive one is wrong with a probability close to error_rate as long as
+    no more than capacity keys are added.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        capacity = max(capacity, 1)
+        self.num_bits = int(
+            math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(
+            1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def _positions(self, key):
+        # Double hashing: k positions out of a single 128 bits digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
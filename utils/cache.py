@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+utils/cache.py
+
+Small in-process caches used to keep hot lookups away from the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    Bounded, thread safe LRU mapping whose entries expire at a given time.
+
+    Every entry carries its own expiration (an epoch timestamp), so cached
+    values never outlive the object they describe (e.g. a JWT and its `exp`).
+    An optional `ttl` (seconds) caps the lifetime of every entry. A cache with
+    `maxsize` <= 0 is disabled and never stores anything.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, timer=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] > self.timer()
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for key, or default if it is missing or expired
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > self.timer():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, expires_at=None):
+        """
+        Stores value under key until expires_at (epoch seconds), evicting the
+        least recently used entries when the cache is full
+        """
+        if self.maxsize <= 0:
+            return
+        now = self.timer()
+        if self.ttl is not None:
+            expires_at = min(expires_at or now + self.ttl, now + self.ttl)
+        if expires_at is None or expires_at <= now:
+            return
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses
+        }
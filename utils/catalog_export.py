@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+utils/catalog_export.py
+
+Full dumps of the items and stores tables as NDJSON or CSV. Rows are read
+from a server-side cursor (BaseModel.stream_all) and encoded, optionally
+gzipped, chunk by chunk, so the memory used does not depend on the size of
+the tables. Used by the export api resource and the export-catalog command.
+"""
+import csv
+import io
+import json
+import zlib
+
+from models.item import ItemModel
+from models.store import StoreModel
+
+# kind -> (model, exported columns, column filtered by store_id)
+EXPORTS = {
+    'items': (ItemModel, ('id', 'name', 'price', 'store_id'), 'store_id'),
+    'stores': (StoreModel, ('id', 'name'), 'id'),
+}
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_rows(kind, store_id=None, batch_size=1000):
+    """
+    Iterates over the exported columns of the rows of kind ('items' or
+    'stores'), those of one store only if store_id is given
+    """
+    model, fields, store_field = EXPORTS[kind]
+    query = model.query_fields(*fields)
+    if store_id is not None:
+        query = query.filter(getattr(model, store_field) == store_id)
+    return model.stream_all(query, batch_size)
+
+
+def iter_ndjson(rows, fields, chunk_size=1000):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(fields, row))) + '\n')
+        if len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def iter_csv(rows, fields, chunk_size=1000):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(fields)
+    for number, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if number % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_gzip(chunks):
+    """
+    Compresses text chunks into a gzip stream as they come
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(kind, fmt='ndjson', store_id=None, gzip=False):
+    """
+    Yields the dump of kind in the format fmt ('ndjson' or 'csv'), as UTF-8
+    encoded chunks, gzip compressed if gzip is true
+    """
+    fields = EXPORTS[kind][1]
+    encode = iter_csv if fmt == 'csv' else iter_ndjson
+    chunks = encode(export_rows(kind, store_id), fields)
+    if gzip:
+        return iter_gzip(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+utils/db_pool.py
+
+Connection pools of the database engines, configured from the DATABASE_POOL_*
+settings and instrumented: every worker counts its checkouts, the time they
+waited for a free connection (histogram) and the checkouts that timed out.
+Together with the live checked out and overflow counts, it tells whether
+workers x pool fits the max_connections of the server and whether requests
+queue for connections.
+"""
+import bisect
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds (ms) of the buckets of the checkout wait histogram
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class PoolCounters(object):
+    """
+    Checkouts of a pool, with the histogram of their waits, and timeouts
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.waits = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def observe(self, seconds, timeout=False):
+        bucket = bisect.bisect_left(WAIT_BUCKETS_MS, seconds * 1000)
+        with self._lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            self.waits[bucket] += 1
+
+    def stats(self):
+        with self._lock:
+            labels = [str(bound) for bound in WAIT_BUCKETS_MS] + ['+Inf']
+            return {
+                'checkouts': self.checkouts,
+                'checkout_timeouts': self.timeouts,
+                'wait_ms_total': round(self.wait_seconds * 1000, 3),
+                'wait_ms_max': round(self.max_wait_seconds * 1000, 3),
+                # Number of checkouts that waited up to N ms
+                'wait_ms_histogram': dict(zip(labels, self.waits)),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long every checkout waits for a connection
+    """
+
+    def __init__(self, creator, **kw):
+        super(InstrumentedQueuePool, self).__init__(creator, **kw)
+        self.counters = PoolCounters()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super(InstrumentedQueuePool, self)._do_get()
+        except exc.TimeoutError:
+            self.counters.observe(time.perf_counter() - start, timeout=True)
+            raise
+        self.counters.observe(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # Engine.dispose() replaces the pool, its counters go on
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.counters = self.counters
+        return pool
+
+
+def pool_options(config):
+    """
+    Returns the create_engine options of the pool of a server database (not
+    SQLite) from the DATABASE_POOL_* settings of config
+    """
+    options = {
+        'poolclass': InstrumentedQueuePool,
+        'max_overflow': config.get('DATABASE_MAX_OVERFLOW', 5),
+        'pool_timeout': config.get('DATABASE_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DATABASE_POOL_RECYCLE', -1),
+        'pool_pre_ping': config.get('DATABASE_POOL_PRE_PING', False),
+    }
+    if config.get('DATABASE_POOL_SIZE'):
+        options['pool_size'] = config['DATABASE_POOL_SIZE']
+    return options
+
+
+def pool_stats(pool):
+    """
+    Returns the live state and the counters of pool
+    """
+    stats = {'class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            # Connections open beyond size, negative while the pool fills up
+            'overflow': pool.overflow(),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(pool.counters.stats())
+    return stats
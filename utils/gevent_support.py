@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+utils/gevent_support.py
+
+Cooperative database access for gevent workers.
+
+The gevent worker of gunicorn patches the standard library before it loads
+the app, so sockets, threads and locks yield to the event loop. psycopg2 is
+a C extension that talks to PostgreSQL through libpq and is not patched: a
+query blocks the whole worker, and every greenlet on it, until the server
+answers. With the wait callback installed here, psycopg2 runs its queries
+in asynchronous mode and the calling greenlet waits for the socket on the
+event loop, so the other greenlets keep running meanwhile.
+"""
+
+
+def gevent_patched():
+    """
+    Tells if the standard library has been patched by gevent
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def patch_all():
+    """
+    Patches the standard library and makes psycopg2 cooperative. Entry points
+    that are not a gevent worker of gunicorn call it before importing anything
+    else, the app included.
+    """
+    from gevent import monkey
+    if not gevent_patched():
+        monkey.patch_all()
+    make_psycopg2_green()
+
+
+def gevent_wait_callback(conn, timeout=None):
+    """
+    Wait callback of psycopg2 that polls the connection and waits for its
+    socket on the gevent event loop
+    """
+    from gevent.socket import wait_read, wait_write
+    from psycopg2 import OperationalError, extensions
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError('Bad result from poll: {!r}'.format(state))
+
+
+def make_psycopg2_green():
+    """
+    Installs gevent_wait_callback in psycopg2, if it is installed. It applies
+    to every connection of the process, open or not.
+    """
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+    extensions.set_wait_callback(gevent_wait_callback)
+    return True
+
+
+def install():
+    """
+    Makes psycopg2 cooperative if the process runs under gevent, see
+    gevent_patched
+    """
+    if gevent_patched():
+        return make_psycopg2_green()
+    return False
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+utils/hashing.py
+
+Password hashing on a bounded pool of OS threads.
+
+PBKDF2 runs in OpenSSL (hashlib.pbkdf2_hmac), which releases the GIL, so a
+real thread can hash while the event loop of a gevent worker keeps serving
+the other greenlets. Without a pool every login blocks the whole worker for
+the duration of the hash.
+
+The PBKDF2 cost (rounds) is configurable: calibrate() measures the host to
+pick it for a latency budget, and needs_rehash() tells which stored hashes
+were made with a different cost, so they can be upgraded at login.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.hash import pbkdf2_sha256 as sha256
+
+_pool_size = 0
+_pool = None
+_handler = sha256
+_lock = threading.Lock()
+
+
+def configure(pool_size, rounds=None):
+    """
+    Sets the number of threads hashing passwords, 0 hashes them inline, and
+    the PBKDF2 rounds of new hashes, None for the passlib default
+    """
+    global _pool_size, _pool, _handler
+    with _lock:
+        _pool_size = pool_size
+        _pool = None
+        _handler = sha256.using(rounds=rounds) if rounds else sha256
+
+
+def _gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def _get_pool():
+    # Created on first use, so every forked worker gets its own threads
+    global _pool
+    with _lock:
+        if _pool is None and _pool_size > 0:
+            if _gevent_patched():
+                # Patched threads are greenlets, gevent's pool has real ones
+                from gevent.threadpool import ThreadPool
+                _pool = ThreadPool(_pool_size)
+            else:
+                _pool = ThreadPoolExecutor(max_workers=_pool_size)
+        return _pool
+
+
+def run(func, *args):
+    """
+    Runs func(*args) on the hashing pool and waits for its result. Under
+    gevent only the calling greenlet waits.
+    """
+    pool = _get_pool()
+    if pool is None:
+        return func(*args)
+    if isinstance(pool, ThreadPoolExecutor):
+        return pool.submit(func, *args).result()
+    return pool.apply(func, args)
+
+
+def hash_password(password):
+    return run(_handler.hash, password)
+
+
+def verify_password(password, hash):
+    return run(sha256.verify, password, hash)
+
+
+def needs_rehash(hash):
+    """
+    True if hash was made with other rounds than the configured ones
+    """
+    return sha256.from_string(hash).rounds != _handler.default_rounds
+
+
+def calibrate(target_ms, samples=5, min_rounds=1000):
+    """
+    Returns the PBKDF2 rounds that take about target_ms milliseconds to hash
+    a password on this host, and the measured milliseconds per 1000 rounds.
+    """
+    probe_rounds = 20000
+    handler = sha256.using(rounds=probe_rounds)
+    best = float('inf')
+    for _ in range(samples):
+        start = time.perf_counter()
+        handler.hash('calibration password')
+        best = min(best, time.perf_counter() - start)
+
+    ms_per_1000 = best * 1000.0 * 1000 / probe_rounds
+    rounds = int(target_ms / ms_per_1000 * 1000) // 1000 * 1000
+    return max(rounds, min_rounds), ms_per_1000
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+utils/item_import.py
+
+Bulk import of items from a request body in NDJSON, CSV or as a JSON array.
+Records are parsed incrementally from the stream, validated one by one
+against the columns of ItemModel, and inserted in batches: one multi-row
+INSERT and one commit per batch. Invalid records are reported with their
+position and skipped, the valid ones are imported.
+"""
+import codecs
+import csv
+import json
+import time
+
+from db import db
+from models.item import ItemModel
+from models.store import StoreModel
+
+FIELDS = ('name', 'price', 'store_id')
+NAME_LENGTH = ItemModel.__table__.c.name.type.length
+
+MIMETYPES = {
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'text/csv': 'csv',
+    'application/json': 'json',
+}
+
+
+class ImportFormatError(ValueError):
+    """
+    The body cannot be parsed any further
+    """
+
+
+def _iter_ndjson(reader):
+    for line in reader:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as ex:
+            yield ex
+
+
+def _iter_csv(reader):
+    for row in csv.DictReader(reader):
+        if None in row:
+            yield ValueError('More values than columns in the header')
+        else:
+            yield row
+
+
+def _iter_json_array(reader, chunk_size=65536):
+    """
+    Yields the values of a JSON array as they are read, without reading the
+    whole array first
+    """
+    decoder = json.JSONDecoder()
+    buffer, eof, state = '', False, 'start'
+    while True:
+        buffer = buffer.lstrip()
+        if not buffer and not eof:
+            chunk = reader.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+
+        if state == 'start':
+            if not buffer.startswith('['):
+                raise ImportFormatError('A JSON array is expected')
+            buffer, state = buffer[1:], 'first'
+        elif state in ('first', 'next'):
+            if not buffer:
+                raise ImportFormatError('Unterminated JSON array')
+            if buffer[0] == ']':
+                return
+            if state == 'next':
+                if buffer[0] != ',':
+                    raise ImportFormatError(
+                        "',' or ']' expected in the JSON array")
+                buffer = buffer[1:]
+            state = 'value'
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except ValueError:
+                value, end = None, None
+            # A value at the end of the buffer, or an invalid one, may just
+            # be cut by the end of the chunk
+            if (end is None or end == len(buffer)) and not eof:
+                chunk = reader.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            if end is None:
+                raise ImportFormatError('Invalid JSON value in the array')
+            yield value
+            buffer, state = buffer[end:], 'next'
+
+
+def iter_records(stream, mimetype):
+    """
+    Yields the records of a byte stream in the format of mimetype, each one
+    a dict or the ValueError of an invalid record. Raises ImportFormatError
+    when the format is not supported or the stream cannot be parsed.
+    """
+    if mimetype not in MIMETYPES:
+        raise ImportFormatError(
+            'Unsupported content type {}, use one of: {}'.format(
+                mimetype, ', '.join(sorted(MIMETYPES))))
+    return _iter_records(stream, mimetype)
+
+
+def _iter_records(stream, mimetype):
+    # Errors raised while reading are fatal for the rest of the body
+    reader = codecs.getreader('utf-8')(stream)
+    records = {
+        'ndjson': _iter_ndjson,
+        'csv': _iter_csv,
+        'json': _iter_json_array,
+    }[MIMETYPES[mimetype]](reader)
+    try:
+        for record in records:
+            yield record
+    except (UnicodeDecodeError, csv.Error) as ex:
+        raise ImportFormatError(str(ex))
+
+
+def validate_item(record):
+    """
+    Returns the row of the items table for record, raises a ValueError
+    describing the first invalid field
+    """
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError('An object with the fields {} is expected'.format(
+            ', '.join(FIELDS)))
+    unknown = set(record) - set(FIELDS)
+    if unknown:
+        raise ValueError('Unknown fields: {}'.format(', '.join(
+            sorted(unknown))))
+    for field in FIELDS:
+        if record.get(field) in (None, ''):
+            raise ValueError('{} cannot be left blank'.format(field))
+
+    name = record['name']
+    if not isinstance(name, str) or len(name) > NAME_LENGTH:
+        raise ValueError('name must be a text of {} characters at most'.format(
+            NAME_LENGTH))
+    try:
+        if isinstance(record['price'], bool):
+            raise TypeError()
+        price = float(record['price'])
+    except (TypeError, ValueError):
+        raise ValueError('price must be a number')
+    try:
+        if isinstance(record['store_id'], (bool, float)):
+            raise TypeError()
+        store_id = int(record['store_id'])
+    except (TypeError, ValueError):
+        raise ValueError('store_id must be an integer')
+    return {'name': name, 'price': price, 'store_id': store_id}
+
+
+class _Batch(object):
+    """
+    Valid rows waiting to be inserted, with their positions in the body
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.positions = []
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def import_items(records, batch_size=500, max_errors=100):
+    """
+    Validates and inserts records (see iter_records) batch_size rows at a
+    time. Rows are rejected when they are invalid, their store does not
+    exist, or an item with their name exists already or earlier in the
+    import. Returns the numbers of inserted and failed rows, and the first
+    max_errors errors with the position (from 1) of their record.
+    """
+    start = time.time()
+    stats = {'inserted': 0, 'failed': 0, 'batches': 0, 'errors': []}
+    store_ids = set()
+
+    def reject(position, message):
+        stats['failed'] += 1
+        if len(stats['errors']) < max_errors:
+            stats['errors'].append({'row': position, 'message': message})
+
+    def flush(batch):
+        # Existence checks of a whole batch, in one query per table
+        missing_stores = {row['store_id'] for row in batch.rows} - store_ids
+        if missing_stores:
+            store_ids.update(
+                store_id for store_id, in db.session.query(StoreModel.id).
+                filter(StoreModel.id.in_(missing_stores)))
+        existing = {
+            name for name, in db.session.query(ItemModel.name).filter(
+                ItemModel.name.in_({row['name'] for row in batch.rows}))
+        }
+
+        # Earlier batches are committed, hence in existing
+        rows, names = [], set()
+        for row, position in zip(batch.rows, batch.positions):
+            if row['store_id'] not in store_ids:
+                reject(position,
+                       'Store {} does not exist'.format(row['store_id']))
+            elif row['name'] in existing or row['name'] in names:
+                reject(position, "An item with name '{}' already exists."
+                       .format(row['name']))
+            else:
+                names.add(row['name'])
+                rows.append(row)
+        if rows:
+            db.session.execute(ItemModel.__table__.insert().values(rows))
+            db.session.commit()
+            stats['inserted'] += len(rows)
+            stats['batches'] += 1
+
+    batch = _Batch()
+    try:
+        for position, record in enumerate(records, 1):
+            try:
+                batch.rows.append(validate_item(record))
+                batch.positions.append(position)
+            except ValueError as ex:
+                reject(position, str(ex))
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = _Batch()
+    except ImportFormatError as ex:
+        stats['format_error'] = str(ex)
+    if len(batch):
+        flush(batch)
+
+    # Store and name checks run when their batch is flushed
+    stats['errors'].sort(key=lambda error: error['row'])
+    stats['seconds'] = round(time.time() - start, 3)
+    return stats
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+utils/jwt_cache.py
+
+Per-process cache of verified JWTs, keyed by a digest of the raw token.
+
+A client sends the same bearer token on every request until it expires, and
+Flask-JWT-Extended verifies its signature and parses its claims every time.
+With JWT_DECODE_CACHE enabled a token is verified once, and its decoded
+claims are served from memory until its `exp`. Only the verification is
+cached: revocation is still checked on every request by the
+token_in_blacklist_loader callback, which runs on the decoded claims.
+"""
+import hashlib
+import inspect
+
+from flask import current_app
+from flask_jwt_extended import utils as jwt_utils, view_decorators
+
+from utils.cache import TTLCache
+
+# The decode_token of the view decorators, restored by uninstall()
+_library_decode_token = view_decorators.decode_token
+# allow_expired appeared in later versions of Flask-JWT-Extended 3
+_accepts_allow_expired = 'allow_expired' in inspect.signature(
+    jwt_utils.decode_token).parameters
+
+
+def _decode(encoded_token, csrf_value=None, allow_expired=False):
+    if allow_expired and _accepts_allow_expired:
+        return jwt_utils.decode_token(encoded_token, csrf_value,
+                                      allow_expired)
+    return jwt_utils.decode_token(encoded_token, csrf_value)
+
+
+def _decode_cache():
+    cache = current_app.extensions.get('jwt_decode_cache')
+    if cache is None:
+        cache = TTLCache(
+            maxsize=current_app.config.get('JWT_DECODE_CACHE_SIZE', 10000))
+        current_app.extensions['jwt_decode_cache'] = cache
+    return cache
+
+
+def _digest(encoded_token, csrf_value):
+    if isinstance(encoded_token, str):
+        encoded_token = encoded_token.encode('utf-8')
+    digest = hashlib.sha256(encoded_token)
+    if csrf_value is not None:
+        # The CSRF double submit value is verified with the token
+        digest.update(b'\0' + csrf_value.encode('utf-8'))
+    return digest.digest()
+
+
+def decode_token(encoded_token, csrf_value=None, allow_expired=False):
+    """
+    Drop-in replacement of flask_jwt_extended.decode_token that verifies a
+    given token once per process while the cache is enabled. Tokens that
+    fail the verification are never cached, so they fail every time.
+    """
+    if (allow_expired or
+            not current_app.config.get('JWT_DECODE_CACHE', False)):
+        return _decode(encoded_token, csrf_value, allow_expired)
+
+    cache = _decode_cache()
+    key = _digest(encoded_token, csrf_value)
+    decoded_token = cache.get(key)
+    if decoded_token is None:
+        decoded_token = _decode(encoded_token, csrf_value)
+        # Tokens without exp would be cached forever
+        if 'exp' in decoded_token:
+            cache.set(key, decoded_token, decoded_token['exp'])
+    # Callers may update the claims of their request
+    return dict(decoded_token)
+
+
+def decode_cache_stats():
+    return _decode_cache().stats()
+
+
+def install():
+    """
+    Makes the protected views of Flask-JWT-Extended decode their tokens
+    with decode_token. Only install it when JWT_DECODE_CACHE is enabled, the
+    views keep the decode_token of the library otherwise.
+    """
+    view_decorators.decode_token = decode_token
+
+
+def uninstall():
+    """
+    Gives the protected views the decode_token of the library back
+    """
+    view_decorators.decode_token = _library_decode_token
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+utils/pagination.py
+
+Cursor (keyset) pagination of the list resources. A page is the first
+`limit` rows, in id order, following the row whose id is `after`; see
+BaseModel.find_page. The body of a page keeps the shape of the whole list,
+the cursor of the next page is sent in the X-Next-Cursor header and its url
+in the Link header. Whole lists (paginate=false) are streamed.
+"""
+from flask import current_app, request
+from flask_restful import inputs, reqparse
+from werkzeug.urls import url_encode
+
+from utils.streaming import JSONArray, json_response
+
+parser = reqparse.RequestParser()
+parser.add_argument('limit', type=inputs.positive, location='args')
+parser.add_argument('after', type=int, location='args')
+
+# Lists that were returned whole can still be, with paginate=false
+list_parser = parser.copy()
+list_parser.add_argument(
+    'paginate', type=inputs.boolean, default=True, location='args')
+
+
+def page_limit(limit=None):
+    """
+    Number of rows of a page: the requested limit, API_PAGE_SIZE by default,
+    and API_MAX_PAGE_SIZE at most
+    """
+    return min(limit or current_app.config['API_PAGE_SIZE'],
+               current_app.config['API_MAX_PAGE_SIZE'])
+
+
+def parse_page_args():
+    """
+    Returns the limit and after arguments of the request to a list resource.
+    limit is None when the request asks for the whole list.
+    """
+    args = list_parser.parse_args()
+    if not args['paginate']:
+        return None, None
+    return page_limit(args['limit']), args['after']
+
+
+def next_page_headers(cursor, limit):
+    """
+    Headers of a page whose next page starts after the cursor, if any
+    """
+    if cursor is None:
+        return {}
+    query = dict(request.args.items(), after=cursor, limit=limit)
+    return {
+        'X-Next-Cursor': str(cursor),
+        'Link': '<{}?{}>; rel="next"'.format(request.base_url,
+                                             url_encode(query))
+    }
+
+
+def list_response(model, key, limit, after, query=None,
+                  to_json=lambda row: row.json(), **fields):
+    """
+    Response of a list resource: {key: [rows], **fields}, where rows are
+    those of query (every model row by default) encoded with to_json.
+    A page is returned with its next page headers, or the whole list is
+    streamed from the database when limit is None.
+    """
+    if limit is None:
+        body = {key: JSONArray(model.stream_all(query), to_json)}
+        body.update(fields)
+        return json_response(body)
+
+    rows, cursor = model.find_page(limit, after, query)
+    body = {key: [to_json(row) for row in rows]}
+    body.update(fields)
+    return body, 200, next_page_headers(cursor, limit)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+utils/query_stats.py
+
+Counts the SQL statements of every request and the time spent running them,
+on every engine. Requests above DB_QUERY_WARN_COUNT statements are logged as
+warnings, which is how N+1 queries (a query per row of a list) show up, and
+with DB_QUERY_HEADERS the counts are sent in the X-DB-Queries and
+Server-Timing headers of the response.
+"""
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    stats = g.get('db_query_stats') if has_app_context() else None
+    if stats is not None:
+        stats['count'] += 1
+        stats['seconds'] += elapsed
+
+
+def _handle_error(context):
+    # after_cursor_execute is not called for failed statements
+    start = context.connection.info.get('query_start')
+    if start:
+        start.pop()
+
+
+def _start_request():
+    g.db_query_stats = {'count': 0, 'seconds': 0.0}
+
+
+def _add_headers(response):
+    stats = g.get('db_query_stats')
+    if stats is not None and current_app.config.get('DB_QUERY_HEADERS'):
+        # Streamed bodies run their queries after the headers are sent
+        response.headers['X-DB-Queries'] = str(stats['count'])
+        response.headers.add(
+            'Server-Timing', 'db;dur={:.2f};desc="{} queries"'.format(
+                stats['seconds'] * 1000, stats['count']))
+    return response
+
+
+def _end_request(exception=None):
+    stats = g.pop('db_query_stats', None)
+    threshold = current_app.config.get('DB_QUERY_WARN_COUNT', 0)
+    if stats is not None and threshold and stats['count'] > threshold:
+        current_app.logger.warning(
+            '%s %s ran %d SQL statements in %.1f ms', request.method,
+            request.path, stats['count'], stats['seconds'] * 1000)
+
+
+def init_app(app):
+    if not event.contains(Engine, 'before_cursor_execute',
+                          _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_add_headers)
+    app.teardown_request(_end_request)
+
+
+@contextmanager
+def recorded_queries():
+    """
+    Records the SQL statements run by any engine in the with block, in the
+    list it returns
+    """
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, 'before_cursor_execute', record)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+utils/replicas.py
+
+Read replicas of the database. GET handlers decorated with read_from_replica
+run their SELECTs on one of the SQLALCHEMY_REPLICA_BINDS (see RoutingSession
+in db.py), everything else runs on the primary.
+
+Every worker checks the lag of each replica at most every
+SQLALCHEMY_REPLICA_CHECK_INTERVAL seconds, in a background thread (a greenlet
+in gevent workers), so requests never wait for a replica that does not
+answer. Replicas lagging more than SQLALCHEMY_REPLICA_MAX_LAG seconds,
+failing the check, or not checked yet, are left out until the next one, and
+requests read from the primary when none is left.
+"""
+import functools
+import random
+import threading
+import time
+
+from flask import current_app, g
+
+# Replication lag in seconds of a PostgreSQL standby. It is 0 while the
+# standby has replayed everything it received, otherwise the time since the
+# last replayed transaction; NULL (0) when the server is not a standby.
+POSTGRESQL_LAG_QUERY = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) '
+    'END')
+
+
+class ReplicaSet(object):
+    """
+    Lag and availability of the replica binds, as seen by this process
+    """
+
+    def __init__(self, binds, max_lag=10.0, check_interval=5.0,
+                 lag_query=None):
+        self.binds = list(binds)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_query = lag_query
+        # bind -> {'lag', 'error', 'checked', 'running'}
+        self.status = {}
+        self._lock = threading.Lock()
+        self._threads = {}
+
+    def _measure(self, engine):
+        query = self.lag_query
+        if query is None and engine.dialect.name == 'postgresql':
+            query = POSTGRESQL_LAG_QUERY
+        with engine.connect() as connection:
+            lag = connection.execute(query or 'SELECT 1').scalar()
+        return float(lag or 0) if query else 0.0
+
+    def _check(self, app, bind, engine, checked):
+        status = {'lag': None, 'error': None, 'checked': checked,
+                  'running': False}
+        try:
+            status['lag'] = self._measure(engine)
+        except Exception as ex:
+            status['error'] = str(ex)
+            app.logger.warning('Read replica %s is unavailable: %s', bind, ex)
+        with self._lock:
+            self.status[bind] = status
+
+    def check(self, bind, engine):
+        """
+        Returns the last status of bind. When it is older than check_interval
+        its lag is measured again in the background, by one thread at a
+        time. Until the first measure ends, or while one lasts more than
+        check_interval, bind is reported as unavailable.
+        """
+        now = time.monotonic()
+        with self._lock:
+            status = self.status.get(bind) or {
+                'lag': None, 'error': 'Not checked yet', 'checked': None,
+                'running': False
+            }
+            if status['running']:
+                if (now - status['checked'] >= self.check_interval and
+                        status['error'] is None):
+                    status = dict(
+                        status, error='No answer in {} s'.format(
+                            round(now - status['checked'], 1)))
+            elif (status['checked'] is None or
+                  now - status['checked'] >= self.check_interval):
+                status = dict(status, checked=now, running=True)
+                thread = threading.Thread(
+                    target=self._check,
+                    args=(current_app._get_current_object(), bind, engine,
+                          now),
+                    name='replica-check',
+                    daemon=True)
+                self._threads[bind] = thread
+                thread.start()
+            self.status[bind] = status
+        return status
+
+    def wait(self, timeout=None):
+        """
+        Waits for the lag checks in progress
+        """
+        for thread in list(self._threads.values()):
+            thread.join(timeout)
+
+    def usable(self, bind, engine):
+        status = self.check(bind, engine)
+        return status['error'] is None and status['lag'] <= self.max_lag
+
+    def choose(self, get_engine):
+        """
+        Returns a random usable replica bind, or None to use the primary.
+        get_engine returns the engine of a bind.
+        """
+        binds = [bind for bind in self.binds
+                 if self.usable(bind, get_engine(bind))]
+        return random.choice(binds) if binds else None
+
+    def stats(self):
+        return {
+            bind: {
+                'lag': self.status.get(bind, {}).get('lag'),
+                'error': self.status.get(bind, {}).get('error'),
+            } for bind in self.binds
+        }
+
+
+def _replica_set():
+    """
+    Returns the per-process ReplicaSet of the current app
+    """
+    config = current_app.config
+    binds = config.get('SQLALCHEMY_REPLICA_BINDS', [])
+    replicas = current_app.extensions.get('db_replicas')
+    if replicas is None or replicas.binds != list(binds):
+        replicas = ReplicaSet(
+            binds,
+            max_lag=config.get('SQLALCHEMY_REPLICA_MAX_LAG', 10.0),
+            check_interval=config.get('SQLALCHEMY_REPLICA_CHECK_INTERVAL',
+                                      5.0),
+            lag_query=config.get('SQLALCHEMY_REPLICA_LAG_QUERY'))
+        current_app.extensions['db_replicas'] = replicas
+    return replicas
+
+
+def choose_replica():
+    """
+    Returns the replica bind the current request should read from, or None
+    """
+    if not current_app.config.get('SQLALCHEMY_REPLICA_BINDS'):
+        return None
+    db = current_app.extensions['sqlalchemy'].db
+    return _replica_set().choose(
+        lambda bind: db.get_engine(current_app, bind=bind))
+
+
+def read_from_replica(view):
+    """
+    Decorator of GET handlers whose reads may be served by a replica, hence
+    slightly stale. Put it below the jwt decorators: the token and its user
+    are loaded before, from the primary.
+    """
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # Kept until the end of the request, streamed bodies read after the
+        # handler returns
+        g.db_read_bind = choose_replica()
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _end_request(exception=None):
+    g.pop('db_read_bind', None)
+
+
+def init_app(app):
+    app.teardown_request(_end_request)
+
+
+def replica_stats():
+    """
+    Returns the last measured lag and error of every replica bind
+    """
+    return _replica_set().stats()
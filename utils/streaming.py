@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+utils/streaming.py
+
+Responses that are encoded and sent while their rows are read from the
+database, so the memory of a worker does not grow with the size of the
+result.
+"""
+from flask import Response, json, stream_with_context
+
+
+class JSONArray(object):
+    """
+    Array of a streamed JSON document: items (e.g. a query using yield_per)
+    are encoded one by one with to_json while the response is sent
+    """
+
+    def __init__(self, items, to_json=lambda item: item.json()):
+        self.items = items
+        self.to_json = to_json
+
+
+def iter_json_array(items, to_json, chunk_size=100):
+    """
+    Encodes items as a JSON array, yielding it in chunks of chunk_size items
+    """
+    yield '['
+    chunk = []
+    separator = ''
+    for item in items:
+        chunk.append(json.dumps(to_json(item)))
+        if len(chunk) == chunk_size:
+            yield separator + ','.join(chunk)
+            separator = ','
+            chunk = []
+    if chunk:
+        yield separator + ','.join(chunk)
+    yield ']'
+
+
+def iter_json(value, chunk_size=100):
+    """
+    Encodes value as JSON incrementally. It may be a JSONArray, or a dict
+    holding JSONArrays, e.g. {'items': JSONArray(query)}; anything else is
+    encoded at once.
+    """
+    if isinstance(value, JSONArray):
+        for chunk in iter_json_array(value.items, value.to_json, chunk_size):
+            yield chunk
+    elif isinstance(value, dict):
+        separator = '{'
+        for key, item in value.items():
+            yield separator + json.dumps(key) + ':'
+            for chunk in iter_json(item, chunk_size):
+                yield chunk
+            separator = ','
+        yield '}' if separator == ',' else '{}'
+    else:
+        yield json.dumps(value)
+
+
+def json_response(value, headers=None):
+    """
+    Streams value as a JSON response, see iter_json. Queries are iterated
+    inside the request context, when the response body is sent.
+    """
+    return Response(
+        stream_with_context(iter_json(value)),
+        mimetype='application/json',
+        headers=headers)
+
+
+def json_array_response(items, to_json=lambda item: item.json(),
+                        headers=None):
+    """
+    Streams items as a JSON array response
+    """
+    return json_response(JSONArray(items, to_json), headers=headers)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+utils/token_partitions.py
+
+Daily partitioning of the revoked_tokens table by its expires column, so
+expired tokens are removed by dropping a whole partition instead of
+deleting them row by row.
+
+Only PostgreSQL (11+) native partitioning is supported. Queries keep going
+to the revoked_tokens parent table, so the models and helpers work the same
+with and without partitions. On other databases expired tokens are removed
+by the chunked deletes of prune_database.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from db import db
+from exception import PartitioningNotSupported
+from models.token import TokenModel
+
+TABLE = TokenModel.__tablename__
+PREFIX = TABLE + '_p'
+
+
+def partition_name(day):
+    """
+    Name of the partition holding the tokens that expire on the given day
+    """
+    return '{}{:%Y%m%d}'.format(PREFIX, day)
+
+
+def partition_day(name):
+    """
+    Day of a partition from its name, or None for other tables
+    """
+    try:
+        return datetime.strptime(name[len(PREFIX):], '%Y%m%d').date()
+    except ValueError:
+        return None
+
+
+def is_supported():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def is_partitioned():
+    """
+    True when revoked_tokens is a partitioned table
+    """
+    if not is_supported():
+        return False
+    kind = db.session.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :table"),
+        {'table': TABLE}).scalar()
+    return kind == 'p'
+
+
+def list_partitions():
+    """
+    Returns the names of the daily partitions of revoked_tokens
+    """
+    rows = db.session.execute(
+        text("SELECT child.relname FROM pg_inherits "
+             "JOIN pg_class parent ON pg_inherits.inhparent = parent.oid "
+             "JOIN pg_class child ON pg_inherits.inhrelid = child.oid "
+             "WHERE parent.relname = :table"), {'table': TABLE})
+    return [name for name, in rows if partition_day(name) is not None]
+
+
+def _create_partition(day):
+    db.session.execute(
+        text("CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+             "FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')".format(
+                 name=partition_name(day),
+                 table=TABLE,
+                 start=day,
+                 end=day + timedelta(days=1))))
+
+
+def ensure_partitions(days_ahead=32, commit=True):
+    """
+    Creates the partitions from today up to days_ahead days. It must cover
+    the lifetime of the longest lived token (refresh tokens): rows beyond it
+    go to the default partition, and a day with rows there cannot get its
+    partition. Such days are logged and skipped, their rows are removed by
+    the chunked deletes of prune_database. Returns the names of the skipped
+    partitions.
+    """
+    if not is_supported():
+        return []
+    today = datetime.utcnow().date()
+    skipped = []
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        try:
+            # A failed partition does not abort the transaction
+            with db.session.begin_nested():
+                _create_partition(day)
+        except SQLAlchemyError as ex:
+            current_app.logger.warning('Partition {} not created: {}'.format(
+                partition_name(day), str(getattr(ex, 'orig', ex)).strip()))
+            skipped.append(partition_name(day))
+    if commit:
+        db.session.commit()
+    return skipped
+
+
+def drop_expired_partitions():
+    """
+    Drops the partitions whose tokens have all expired, those of the days
+    before today. Returns the names of the dropped partitions.
+    """
+    today = datetime.utcnow().date()
+    dropped = []
+    for name in list_partitions():
+        if partition_day(name) < today:
+            db.session.execute(text('DROP TABLE IF EXISTS {}'.format(name)))
+            dropped.append(name)
+    db.session.commit()
+    return dropped
+
+
+def partition_table(days_ahead=32):
+    """
+    Converts revoked_tokens into a table partitioned by day of expiry, with
+    a default partition for out of range rows, and moves its rows over. It
+    runs in one transaction; existing tokens stay valid.
+    """
+    if not is_supported():
+        raise PartitioningNotSupported(
+            'Token partitions require PostgreSQL, {} found'.format(
+                db.engine.dialect.name))
+    if is_partitioned():
+        ensure_partitions(days_ahead)
+        return
+
+    old_table = TABLE + '_unpartitioned'
+    statements = [
+        'ALTER TABLE {table} RENAME TO {old}',
+        'ALTER INDEX IF EXISTS {table}_pkey RENAME TO {old}_pkey',
+        'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) '
+        'PARTITION BY RANGE (expires)',
+        # The partition key must be part of the primary key
+        'ALTER TABLE {table} ADD PRIMARY KEY (id, expires)',
+        'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT',
+    ]
+    for statement in statements:
+        db.session.execute(text(statement.format(table=TABLE, old=old_table)))
+
+    ensure_partitions(days_ahead, commit=False)
+
+    # Tokens expired before today are not moved, nobody can use them
+    db.session.execute(
+        text('INSERT INTO {table} SELECT * FROM {old} '
+             'WHERE expires >= :today'.format(table=TABLE, old=old_table)),
+        {'today': datetime.utcnow().date()})
+    statements = [
+        # The id sequence is owned by the old table, keep it alive
+        'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id',
+        'DROP TABLE {old}',
+    ]
+    for statement in statements:
+        db.session.execute(text(statement.format(table=TABLE, old=old_table)))
+
+    # Indexes on the parent table are created on every partition
+    for index in TokenModel.__table__.indexes:
+        db.session.execute(text(_index_ddl(index)))
+    db.session.commit()
+
+
+def _index_ddl(index):
+    """
+    CREATE INDEX statement of a TokenModel index on the partitioned table.
+    Unique indexes must include the partition key, so jti is unique per day
+    of expiry there: jtis are random uuids, it makes no difference.
+    """
+    columns = [column.name for column in index.columns]
+    if index.unique and 'expires' not in columns:
+        columns.append('expires')
+    return 'CREATE {unique}INDEX {name} ON {table} ({columns})'.format(
+        unique='UNIQUE ' if index.unique else '',
+        name=index.name,
+        table=TABLE,
+        columns=', '.join(columns))
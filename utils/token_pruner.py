@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+utils/token_pruner.py
+
+Background scheduler that deletes expired tokens every few minutes.
+"""
+import threading
+
+from db import db
+from utils.blacklist_helpers import prune_database
+
+
+class TokenPruner(object):
+    """
+    Runs prune_database every interval seconds in a daemon thread.
+    Pruners of several workers do not conflict, each batch deletes whatever
+    expired rows are left.
+    """
+
+    def __init__(self, app, interval=3600, batch_size=1000, pause=0.1):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='token-pruner', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    stats = prune_database(self.batch_size, self.pause)
+                    self.app.logger.info(
+                        'Pruned {deleted} expired tokens in {seconds}s '
+                        '({rows_per_second} rows/s)'.format(**stats))
+                except Exception as ex:
+                    db.session.rollback()
+                    self.app.logger.error(
+                        '\nToken pruner error: {0} \n'.format(ex))
+                finally:
+                    db.session.remove()
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+utils/token_writer.py
+
+Write-behind writer that batches the tokens issued at login into multi-row
+INSERTs, so login storms do not serialize on one commit per login.
+"""
+import atexit
+import queue
+import threading
+import time
+
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from exception import TokenWriteError
+from models.token import TokenModel
+
+
+class TokenWriter(object):
+    """
+    Queues token rows and writes them from a background thread, every
+    flush_interval seconds or as soon as batch_size rows are waiting.
+
+    The queue is bounded: put() blocks up to put_timeout seconds when it is
+    full, then gives up so the caller can write the rows itself. Rows stay
+    visible through pending() until they are committed. A batch that still
+    fails after its retries is kept and tried again with the next batches,
+    and flush() raises a TokenWriteError while the rows it waits for are not
+    written.
+    """
+
+    def __init__(self,
+                 app,
+                 batch_size=500,
+                 flush_interval=0.05,
+                 queue_size=10000,
+                 put_timeout=1.0,
+                 retries=3):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._pending = {}
+        # Rows of the batches that failed, written first with the next batch
+        self._failed = []
+        self.failed_batches = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        # Notified after every write attempt of a batch
+        self._written = threading.Condition(self._lock)
+        self._writes = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='token-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def put(self, rows):
+        """
+        Queues token rows for writing. Returns the rows that could not be
+        queued because the queue stayed full for put_timeout seconds, the
+        caller must write them itself.
+        """
+        self.start()
+        with self._lock:
+            for row in rows:
+                self._pending[row['jti']] = row
+        for index, row in enumerate(rows):
+            try:
+                self.queue.put(row, timeout=self.put_timeout)
+            except queue.Full:
+                rejected = rows[index:]
+                with self._lock:
+                    for rejected_row in rejected:
+                        self._pending.pop(rejected_row['jti'], None)
+                return rejected
+        return []
+
+    def pending(self, jti):
+        """
+        Returns the row of a token still waiting to be written, or None
+        """
+        return self._pending.get(jti)
+
+    def pending_rows(self, match):
+        """
+        Returns the rows still waiting to be written for which match(row) is
+        true
+        """
+        with self._lock:
+            return [row for row in self._pending.values() if match(row)]
+
+    def flush(self, match=None):
+        """
+        Blocks until the rows waiting to be written, or only those for which
+        match(row) is true, have been written. Raises a TokenWriteError if
+        some of them are rows of failed batches still not written.
+        """
+        if self._thread is None:
+            return
+        with self._lock:
+            jtis = [
+                jti for jti, row in self._pending.items()
+                if match is None or match(row)
+            ]
+            # The failed rows are tried again by the batch after the one
+            # being written, if any
+            writes = self._writes + 2
+
+            def unwritten():
+                return [jti for jti in jtis if jti in self._pending]
+
+            def done():
+                if not unwritten() or not self._thread.is_alive():
+                    return True
+                failed = {row['jti'] for row in self._failed}
+                return (self._writes >= writes and
+                        all(jti in failed for jti in unwritten()))
+
+            self._written.wait_for(done)
+            failed = len(unwritten())
+        if failed:
+            raise TokenWriteError('{} tokens could not be written: {}'.format(
+                failed, self.last_error))
+
+    def stop(self, timeout=None):
+        """
+        Writes the rows still queued and stops the background thread
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not (self._stopped.is_set() and self.queue.empty()):
+            batch, retried = self._take_batch()
+            if batch:
+                self._write(batch, retried)
+            for _ in range(len(batch) - retried):
+                self.queue.task_done()
+        if self._failed:
+            self.app.logger.error(
+                '\nToken writer stopped, {0} tokens were not written: {1} \n'
+                .format(len(self._failed), self.last_error))
+
+    def _take_batch(self):
+        """
+        Returns the rows of the next batch, and how many of them are failed
+        rows, which come first. They stay failed until they are written.
+        """
+        with self._lock:
+            batch = self._failed[:self.batch_size]
+        retried = len(batch)
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch, retried
+
+    def _insert(self, batch):
+        try:
+            db.session.execute(TokenModel.__table__.insert().values(batch))
+            db.session.commit()
+        except IntegrityError:
+            # Tokens revoked by another worker before they were written here
+            # (see revoke_token) have their row already
+            db.session.rollback()
+            existing = {
+                jti for jti, in db.session.query(TokenModel.jti).filter(
+                    TokenModel.jti.in_([row['jti'] for row in batch]))
+            }
+            rows = [row for row in batch if row['jti'] not in existing]
+            if len(rows) == len(batch):
+                raise
+            if rows:
+                db.session.execute(TokenModel.__table__.insert().values(rows))
+                db.session.commit()
+
+    def _write(self, batch, retried=0):
+        error = None
+        with self.app.app_context():
+            for attempt in range(1, self.retries + 1):
+                try:
+                    self._insert(batch)
+                    error = None
+                    break
+                except Exception as ex:
+                    db.session.rollback()
+                    error = ex
+                    self.app.logger.error(
+                        '\nToken writer error (attempt {0}): {1} \n'.format(
+                            attempt, ex))
+                    time.sleep(self.flush_interval * attempt)
+            db.session.remove()
+
+        with self._lock:
+            if error is None:
+                for row in batch:
+                    self._pending.pop(row['jti'], None)
+                del self._failed[:retried]
+            else:
+                # Still pending, hence valid in this worker, and retried
+                self.failed_batches += 1
+                self.last_error = str(error)
+                self._failed.extend(batch[retried:])
+            self._writes += 1
+            self._written.notify_all()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': self.queue.qsize(),
+                'pending': len(self._pending),
+                'failed': len(self._failed),
+                'failed_batches': self.failed_batches,
+                'last_error': self.last_error,
+            }
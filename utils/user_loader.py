@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+utils/user_loader.py
+
+Loads the users of JWT protected requests with a per-process cache, so
+authenticated traffic does not query the users table on every request.
+"""
+from flask import current_app, g
+from flask_jwt_extended import get_jwt_claims
+
+from db import db
+from models.user import UserModel
+from utils.cache import TTLCache
+
+
+class ClaimsPrincipal(object):
+    """
+    Lightweight user built from the claims of an access token (see
+    add_claims_to_access_token in app.py), without loading it from the
+    database. It has the attributes the app reads from a UserModel.
+    """
+
+    def __init__(self, identity, claims):
+        self.id = claims['id']
+        self.username = identity
+        self.is_admin = claims.get('is_admin', False)
+        self.permissions = claims.get('permissions', [])
+
+    def __str__(self):
+        return "User(id='%s')" % self.id
+
+
+def _user_cache():
+    """
+    Returns the per-process cache of identity -> user for the current app
+    """
+    cache = current_app.extensions.get('users_cache')
+    if cache is None:
+        cache = TTLCache(
+            maxsize=current_app.config.get('USER_CACHE_SIZE', 1000),
+            ttl=current_app.config.get('USER_CACHE_TTL', 60))
+        current_app.extensions['users_cache'] = cache
+    return cache
+
+
+def load_user(identity):
+    """
+    Returns the user with the given identity (username), or None.
+    It is memoized for the rest of the request and cached by the process for
+    USER_CACHE_TTL seconds. Cached users are detached from the session, use
+    them to read the user, not to update it.
+
+    With JWT_CLAIMS_ONLY_PRINCIPAL enabled, access tokens get a
+    ClaimsPrincipal built from their claims and the database is not used at
+    all; the lifetime of access tokens bounds how stale it can be. Refresh
+    tokens carry no claims, their user is still loaded.
+    """
+    if current_app.config.get('JWT_CLAIMS_ONLY_PRINCIPAL', False):
+        claims = get_jwt_claims()
+        if 'id' in claims:
+            return ClaimsPrincipal(identity, claims)
+
+    loaded_users = g.setdefault('loaded_users', {})
+    if identity in loaded_users:
+        return loaded_users[identity]
+
+    cache = _user_cache()
+    user = cache.get(identity)
+    if user is None:
+        user = UserModel.find_by_username(identity)
+        if user is not None:
+            db.session.expunge(user)
+            cache.set(identity, user)
+
+    loaded_users[identity] = user
+    return user
+
+
+def invalidate_user(identity):
+    """
+    Removes a user from the cache, e.g. after deleting it
+    """
+    _user_cache().pop(identity)
+    g.setdefault('loaded_users', {}).pop(identity, None)
+
+
+def clear_users():
+    """
+    Removes every user from the cache
+    """
+    _user_cache().clear()
+    g.pop('loaded_users', None)
+
+
+def user_cache_stats():
+    return _user_cache().stats()